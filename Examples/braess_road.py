@@ -1,5 +1,5 @@
 from core.gui import PATCH_COLS, PATCH_ROWS
-from core.world_patch_block import World, Patch
+from core.world_patch_block import World, Patch, PatchVariable
 from core.agent import Agent
 from pygame.color import Color
 from random import randint
@@ -22,6 +22,9 @@ CONSTANT_CONGESTION_DELAY = 15
 # VARIABLE_CONGESTION_DELAY = 2
 
 class Braess_Road_Patch(Patch):
+
+    delay = PatchVariable(int, 1)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.road_type = None
@@ -1,8 +1,6 @@
 
 from __future__ import annotations
 
-from copy import copy
-from itertools import chain, repeat
 from random import choice
 
 import numpy as np
@@ -14,8 +12,109 @@ from core.sim_engine import gui_get, gui_set
 from core.utils import bin_str
 
 
+class CA_History:
+    """
+    The lines of the CA, oldest first, in a fixed-capacity ring buffer: a 2-D numpy array with a row per line.
+    Only the last capacity lines are kept, which is all set_display_from_lines ever shows.
+
+    All the lines are the same width. They cover columns range(self.start, self.end), where the initial line
+    starts at column 0. Column c of a line is in column c + self.shift of its row of self.cells, and whatever
+    is outside the line's extent when it is stored is 0. So when the lines are widened, the new cells at
+    the ends are already 0, and widening is just decrementing self.start or incrementing self.end. When the
+    lines outgrow self.cells, it is replaced by one twice as wide.
+
+    If spill_file is given, each line that drops out of the buffer is appended to it. line() reads those
+    lines back through a memory map.
+    """
+
+    def __init__(self, capacity, spill_file=None):
+        self.capacity = capacity
+        self.cells = np.zeros((capacity, 0), dtype=np.uint8)
+        (self.start, self.end, self.shift) = (0, 0, 0)
+        self.nbr_lines = 0
+
+        self.spill_file = spill_file
+        # For each spilled line, its (byte offset in spill_file, first column, width).
+        self.spilled = []
+        if spill_file:
+            open(spill_file, 'wb').close()
+
+    def __len__(self):
+        return self.nbr_lines
+
+    def append(self, line: np.ndarray):
+        """ line is a numpy array of 0's and 1's covering columns range(self.start, self.end). """
+        if self.nbr_lines == 0:
+            self.end = self.start + len(line)
+            self.make_room()
+        row = self.nbr_lines % self.capacity
+        if self.nbr_lines >= self.capacity and self.spill_file:
+            self.spill(row)
+        self.cells[row] = 0
+        self.cells[row, self.start + self.shift:self.end + self.shift] = line
+        self.nbr_lines += 1
+
+    def line(self, index):
+        """ The line at index, which may be negative, as a numpy array covering range(self.start, self.end). """
+        if index < 0:
+            index += self.nbr_lines
+        if not 0 <= index < self.nbr_lines:
+            raise IndexError(f'Line {index} of {self.nbr_lines}')
+        if index >= self.nbr_lines - self.capacity:
+            row = self.cells[index % self.capacity]
+            return row[self.start + self.shift:self.end + self.shift]
+        if index >= len(self.spilled):
+            raise IndexError(f'Line {index} is no longer kept. Only the last {self.capacity} lines are.')
+        # A spilled line covers the columns the lines covered when it was spilled. Pad it to the current ones.
+        (offset, start, width) = self.spilled[index]
+        spilled_line = np.memmap(self.spill_file, dtype=np.uint8, mode='r', offset=offset, shape=(width, ))
+        line = np.zeros(self.end - self.start, dtype=np.uint8)
+        line[start - self.start:start - self.start + width] = spilled_line
+        return line
+
+    def make_room(self):
+        """ If the lines no longer fit in self.cells, copy them into one at least twice as wide. """
+        (buffer_width, width) = (self.cells.shape[1], self.end - self.start)
+        if 0 <= self.start + self.shift and self.end + self.shift <= buffer_width:
+            return
+        new_width = max(2*buffer_width, 2*width)
+        # Center the lines in the new buffer.
+        new_shift = (new_width - width)//2 - self.start
+        new_cells = np.zeros((self.capacity, new_width), dtype=np.uint8)
+        (old_start, old_end) = (max(0, self.start + self.shift), min(buffer_width, self.end + self.shift))
+        new_cells[:, old_start - self.shift + new_shift:old_end - self.shift + new_shift] = \
+            self.cells[:, old_start:old_end]
+        (self.cells, self.shift) = (new_cells, new_shift)
+
+    def spill(self, row):
+        """ Append the line in row, which is about to be overwritten, to self.spill_file. """
+        with open(self.spill_file, 'ab') as spill_file:
+            offset = spill_file.tell()
+            spill_file.write(self.cells[row, self.start + self.shift:self.end + self.shift].tobytes())
+        self.spilled.append((offset, self.start, self.end - self.start))
+
+    def widen(self, left, right):
+        """ Add a 0 cell to the left and/or right end of every line. """
+        self.start -= left
+        self.end += right
+        self.make_room()
+
+    @property
+    def width(self):
+        return self.end - self.start
+
+    def window(self, nbr_lines):
+        """ The last nbr_lines lines (or all of them if there are fewer) as an array with a row per line. """
+        nbr_lines = min(nbr_lines, self.nbr_lines, self.capacity)
+        rows = [i % self.capacity for i in range(self.nbr_lines - nbr_lines, self.nbr_lines)]
+        return self.cells[rows, self.start + self.shift:self.end + self.shift]
+
+
 class CA_World(OnOffWorld):
 
+    # If set to a file name, the lines that scroll off the display are saved there. See CA_History.
+    history_file = None
+
     ca_display_size = 225
 
     # bin_0_to_7 is ['000' .. '111']
@@ -39,17 +138,21 @@ class CA_World(OnOffWorld):
         # (You might also try rule 165.)
         # The following sets the local variable self.rule_nbr. It doesn't change the 'Rule_nbr' slider widget.
         self.rule_nbr = 110
-        # Set the switches and the binary representation of self.rule_nbr.
+        # self.rule_table is self.rule_nbr decoded into the new value for each of the 8 triples.
+        # See set_rule_table_from_rule_nbr().
+        self.rule_table = None
+        # Set the switches, the binary representation of self.rule_nbr, and self.rule_table.
         self.set_switches_from_rule_nbr()
         self.set_binary_nbr_from_rule_nbr()
+        self.set_rule_table_from_rule_nbr()
 
-        # self.ca_lines is a list of lines, each of which is a list or string of 0/1. Each line
-        # representsa state of the CA, i.e., all the symbols in the line. self.ca_list contains
-        # the entire history of the CA.
+        # self.ca_lines is a CA_History of lines, each of which is a numpy array of 0/1. Each line
+        # represents a state of the CA, i.e., all the symbols in the line. It keeps the recent
+        # history of the CA. The lines are handed to and from the rules as lists or strings.
         self.lists = None
         self.padding_element = None
-        self.ca_lines = []
-        gui_set('rows', value=len(self.ca_lines))
+        self.ca_lines = None
+        gui_set('rows', value=0)
 
     def build_initial_line(self):
         """
@@ -101,21 +204,19 @@ class CA_World(OnOffWorld):
             new_line.pop(-1)
         return new_line
 
-    # Used only for the list case
     def extend_ca_lines_if_needed(self, new_line):
         """
         new_line is one cell longer at each then than ca_lines[-1]. If those extra
         cells are 0, delete them. If they are 1, insert a 0 cell at the corresponding
-        end of each line in ca_lines
+        end of each line in ca_lines. CA_History does that without touching the lines.
         """
         # new_line is longer than the original line by one on each end.
         # Extend the other lines in self.ca_lines for the ends that are non-zero
-        if new_line[0] or new_line[-1]:
-            for line in self.ca_lines:
-                if new_line[0]:
-                    line.insert(0, 0)
-                if new_line[-1]:
-                    line.append(0)
+        self.ca_lines.widen(new_line[0] in (1, '1'), new_line[-1] in (1, '1'))
+
+    def cells_to_line(self, cells: np.ndarray):
+        """ The inverse of line_to_cells. """
+        return cells.tolist() if self.lists else (cells + ord('0')).tobytes().decode()
 
     def generate_new_line_from_current_line(self, prev_line):
         """
@@ -126,16 +227,18 @@ class CA_World(OnOffWorld):
         1. Add '00' or (0, 0) to both ends of prev_line. (We do that because we want to allow the
         new line to extend the current line on either end. So start with a default extension.
         In addition, we need a triple to generate the symbols at the end of the new line.)
-        Strings are immutable; string concatenation (+) does not change the original strings.
 
-        2. Apply the rules (i.e., the switches) to the triples extracted from the line resulting from step 1.
+        2. Apply the rule to all the triples of the line resulting from step 1 at once.
 
-            a. Look up the truth value of each triple. Is its switch on or off?
-            b. Convert that boolean first to an int (0 or 1) and then to a character ('0' or '1').
-            These two steps are done in a single list comprehension. The result is new_line_chars: List[str].
-            Each element of new_line_chars is a string of one character, either '0' or '1'.
+            a. Convert the line to a numpy array of 0's and 1's.
+            b. Number each triple (left, center, right) as (left << 2) | (center << 1) | right, which
+            is the position of its switch in the rule number. The three shifted slices of the array
+            give those numbers for all the triples in one operation.
+            c. Look the numbers up in self.rule_table, which holds the switch settings.
+            d. Convert the result back to a list or a string.
 
-            c. Use join to combine that list of characters into a new string.
+        The switches are read only when the rule changes (see set_rule_table_from_rule_nbr), not for
+        every cell.
 
         This produces a line which is one symbol shorter than the current prev_line on each end.
         That is, it is one symbol longer on each end than the original current line. It may have
@@ -145,24 +248,20 @@ class CA_World(OnOffWorld):
             prev_line: The current state of the CA.
         Returns: The next state of the CA.
         """
-        # Extend the current line two to the left and right.
+        # (2a)
+        cells = self.line_to_cells(prev_line)
+        # (1) Extend the current line two to the left and right.
         # Want to be able to generate one additional value at each end.
-        if self.lists:
-            prev_line.insert(0, 0)
-            prev_line.insert(0, 0)
-            prev_line.extend([0, 0])
-            triples = [''.join(map(str, prev_line[i:i + 3])) for i in range(len(prev_line) - 2)]
-            new_line = [int(gui_get(triple)) for triple in triples]
-        else:
-            prev_line = '00' + prev_line + '00'
+        cells = np.pad(cells, 2)
+
+        # (2b) The triple centered on cell i is numbered from cells i-1, i, and i+1.
+        triples = (cells[:-2] << 2) | (cells[1:-1] << 1) | cells[2:]
 
-            # For each triple of characters in the prev_line, look up the setting of the corresponding switch.
-            # (gui_get(prev_line[i:i + 3]))
-            # Convert its Truth value (rule is on/off) to an int and then to a one character str.
-            new_line_chars = [str(int(gui_get(prev_line[i:i + 3]))) for i in range(len(prev_line) - 2)]
+        # (2c)
+        new_cells = self.rule_table[triples]
 
-            # Finally, join those strings together into a new string.
-            new_line = ''.join(new_line_chars)
+        # (2d)
+        new_line = self.cells_to_line(new_cells)
         return new_line
 
     def get_rule_nbr_from_switches(self):
@@ -171,9 +270,8 @@ class CA_World(OnOffWorld):
         This is the inverse of set_switches_from_rule_nbr(), but it doesn't set the 'Rule_nbr' Slider.
         """
         rule_nbr = 0
-        (_event, values) = gui.WINDOW.read(timeout=10)
         for (pos, key) in self.pos_to_switch.items():
-            if values[key]:
+            if gui_get(key):
                 rule_nbr += pos
         return rule_nbr
 
@@ -195,6 +293,14 @@ class CA_World(OnOffWorld):
             disabled = gui_get('Random?')
             gui_set('init_line', visible=not disabled, value='1')
 
+    def line_to_cells(self, line):
+        """
+        line, a list or string of 0/1, as a numpy array.
+        For strings, the characters '0' and '1' are the bytes ord('0') and ord('0') + 1.
+        """
+        return np.array(line, dtype=np.uint8) if self.lists else \
+               np.frombuffer(line.encode(), dtype=np.uint8) - ord('0')
+
     def make_switches_and_rule_nbr_consistent(self):
         """
         Make the Slider, the switches, and the bin number consistent: all should contain self.rule_nbr.
@@ -206,6 +312,7 @@ class CA_World(OnOffWorld):
             self.rule_nbr = gui_get('Rule_nbr')
             self.set_switches_from_rule_nbr()
         self.set_binary_nbr_from_rule_nbr()
+        self.set_rule_table_from_rule_nbr()
 
     def set_binary_nbr_from_rule_nbr(self):
         """
@@ -237,7 +344,7 @@ class CA_World(OnOffWorld):
         display_width = gui.PATCH_COLS
 
         # All the lines in self.ca_lines are the same length.
-        ca_line_width = len(self.ca_lines[0])
+        ca_line_width = self.ca_lines.width
 
         # How many blanks must be prepended to a line to be displayed to fill a display row?
         # Will be 0 if the ca_line is at least as long as the display row or the line is left-justified.
@@ -245,63 +352,37 @@ class CA_World(OnOffWorld):
                               (display_width - ca_line_width)//2  if justification == 'Center' else \
                               display_width - ca_line_width     # if justification == 'Right'
 
-        # Use [0]*n to get a list of n 0s to use as left padding.
-        left_padding = self.padding_element * left_padding_needed
-
         # Which symbols of the ca_line are to be displayed?
         # More to the point, what is index of the first symbol of the line to be displayed?
-        # Will be 0 if left_padding is the empty list. Otherwise compute the values for the other cases.
+        # Will be 0 if there is left padding. Otherwise compute the values for the other cases.
         left_ca_line_index = 0 if display_width >= ca_line_width or justification == 'Left' else \
                              (ca_line_width - display_width)//2  if justification == 'Center' else \
                              ca_line_width - display_width     # if justification == 'Right'
 
-        # Reverse both self.ca_lines and CA_World.patches_array.
-        ca_lines_to_display = reversed(self.ca_lines)
-        patch_rows_to_display_on = np.flip(CA_World.patches_array, axis=0)
-
-        # Now we can use zip to match up ca_lines_to_display and patch_rows_to_display on.
-        # In both cases we are starting at the bottom and working our way up.
-        ca_lines_patch_rows = zip(ca_lines_to_display, patch_rows_to_display_on)
-
-        # zip is given two iterables and produces a sequence of pairs of elements, one from each.
-        # An important feature of zip is that it stops whenever either of its arguments ends.
-        # In particular, the two arguments needn't be the same length. Zip simply uses all the elements
-        # of the shorter argument and pairs them with the initial elements of the longer argument.
-
-        # We can now step through the corresponding pairs.
-        for (ca_line, patch_row) in ca_lines_patch_rows:
-            # The values in ca_line are to be displayed on patch_row.
-            # The issue now is how to align them.
-
-            # Which symbols of ca_line should be displayed?
-            # We display all the symbols starting at left_ca_line_index (computed above).
-            # Use a slice to identify these symbols.
-            ca_line_portion = ca_line[left_ca_line_index:]
+        # The last lines, as many as there are patch rows, with a row per line. Then the symbols
+        # to display: those from left_ca_line_index on, but no more than fit next to the padding.
+        lines = self.ca_lines.window(gui.PATCH_ROWS)
+        ca_lines_portion = lines[:, left_ca_line_index:left_ca_line_index + display_width - left_padding_needed]
 
-            # For the complete display line and the desired justification,
-            # we may need to pad ca_line_portion to the left or right (or both).
-            # We need left_padding (computed above) to the left and an arbitrary sequence of 0's to the right.
-            # (Use repeat() from itertools for the padding on the right. It doesn't matter if it's too long!)
+        # Build the whole display as an array, starting from all 0's. The lines go at the bottom,
+        # the newest on the last row, after left_padding_needed 0's.
+        display = np.zeros((gui.PATCH_ROWS, display_width), dtype=bool)
+        (nbr_lines, portion_width) = ca_lines_portion.shape
+        display[gui.PATCH_ROWS - nbr_lines:, left_padding_needed:left_padding_needed + portion_width] = \
+            ca_lines_portion
 
-            # Put the three pieces together to get the full line.
-            # Use chain() from itertools to combine the three parts of the line:
-            #                   left_padding, ca_line_portion, right_padding.
-            padded_line = chain(left_padding, ca_line_portion, repeat('0'))
+        # Use the set_on_off() method of OnOffPatch to set the patches whose values changed.
+        changed = OnOffPatch.is_on.array != display
+        for patch in CA_World.patches_array[changed]:
+            patch.set_on_off(display[patch.array_index])
 
-            # padded_line has the right number of 0's at the left. It then contains the symbols from ca_line
-            # to be displayed. If we need more symbols to display, padded_line includes an unlimted number of
-            # trailing 0's.
-
-            # Since padded_line will be displayed on patch_row, we can use zip again to pair up the values
-            # from padded_line with the Patches in patch_row. Since padded_line includes an unlimited number
-            # of 0's at the end, zip will stop when it reaches the last Patch in patch_row.
-
-            ca_values_patchs = zip(padded_line, patch_row)
-
-            # Step through these value/patch pairs and put the values into the associated Patches.
-            for (ca_val, patch) in ca_values_patchs:
-                # Use the set_on_off() method of OnOffPatch to set the patch based on ca_val.
-                patch.set_on_off(int(ca_val))
+    def set_rule_table_from_rule_nbr(self):
+        """
+        Decode self.rule_nbr into self.rule_table, a numpy array of 8 0's and 1's.
+        The switch for triple i, e.g., '110' for i == 6, is bit i of self.rule_nbr. So
+        self.rule_table[(left << 2) | (center << 1) | right] is the new value of the center cell.
+        """
+        self.rule_table = np.array([(self.rule_nbr >> i) & 1 for i in range(8)], dtype=np.uint8)
 
     def set_switches_from_rule_nbr(self):
         """
@@ -327,7 +408,7 @@ class CA_World(OnOffWorld):
         use the value derived from the switches as the new value of self.rule_nbr.
 
         Once the slider, the switches, and the bin_string of the rule number are consistent,
-        set self.ca_lines[0] to the line generated by build_initial_line.
+        start self.ca_lines with the line generated by build_initial_line.
         """
         self.lists = gui_get('lists_or_strings') == 'Lists'
         self.padding_element = [0] if self.lists else '0'
@@ -339,34 +420,26 @@ class CA_World(OnOffWorld):
 
         initial_line = self.build_initial_line()
 
-        self.ca_lines = [initial_line]
+        self.ca_lines = CA_History(gui.PATCH_ROWS, CA_World.history_file)
+        self.ca_lines.append(self.line_to_cells(initial_line))
 
         self.set_display_from_lines()
 
     def step(self):
         """
         Take one step in the simulation.
-        (a) Generate an additional line for the ca. (Use a copy of self.ca_lines[-1].)
+        (a) Generate an additional line for the ca from self.ca_lines[-1].
         (b) Extend all lines in ca_lines if the new line is longer (with additional 1's) than its predecessor.
         (c) Trim the new line and add it to the end of self.ca_lines.
         (d) Refresh display from values in self.ca_lines.
         """
         # (a)
-        new_line: str = self.generate_new_line_from_current_line(copy(self.ca_lines[-1]))
+        new_line = self.generate_new_line_from_current_line(self.cells_to_line(self.ca_lines.line(-1)))
 
         # (b)
         # Extend lines in self.ca_lines at each end as needed. (Don't extend for extra 0's at the ends.)
-        if self.lists:
-            self.extend_ca_lines_if_needed(new_line)
-        else:  # Strings
-            line_end = {'1': '0', '0': ''}
-            # If either end is '1', add '0' to that end of all strings.
-            # Can't drop the 0's first because we would lose track of which end was extended.
-            if '1' in (new_line[0], new_line[-1]):
-                # Use the line_end dictionary to look up values for left_end and right_end
-                left_end = line_end[new_line[0]]
-                right_end = line_end[new_line[-1]]
-                self.ca_lines = [left_end + line + right_end for line in self.ca_lines]
+        # Can't drop the 0's first because we would lose track of which end was extended.
+        self.extend_ca_lines_if_needed(new_line)
 
         # (c)
         if self.lists:
@@ -377,7 +450,7 @@ class CA_World(OnOffWorld):
             trimmed_new_line: str = new_line[start:end]
 
         # Add trimmed_new_line to the end of self.ca_lines
-        self.ca_lines.append(trimmed_new_line)
+        self.ca_lines.append(self.line_to_cells(trimmed_new_line))
 
         # (d)
         # Refresh the display from self.ca_lines
@@ -95,7 +95,7 @@ class Force_Layout_Node(Agent):
 
     def delete(self):
         World.agents.remove(self)
-        World.links -= {lnk for lnk in World.links if lnk.includes(self)}
+        World.links -= World.links.links_of(self)
 
     def draw(self, shape_name=None):
         super().draw(shape_name=shape_name)
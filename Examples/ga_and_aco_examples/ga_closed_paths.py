@@ -182,7 +182,7 @@ class Cycle_World(GA_World):
 
     def set_results(self):
         super().set_results()
-        World.links = set()
+        World.links.clear()
         best_chromosome: Cycle_Chromosome = self.best_ind.chromosome
         best_chromosome.link_chromosome()
         # Never stop
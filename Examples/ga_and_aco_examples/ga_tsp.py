@@ -12,7 +12,7 @@ from core.ga import Chromosome, GA_World, Gene, Individual, gui_left_upper
 from core.link import Link, minimum_spanning_tree, seq_to_links
 from core.pairs import Velocity
 from core.sim_engine import draw_links, gui_get, gui_set, SimEngine
-from core.world_patch_block import World
+from core.world_patch_block import LinkSet, World
 
 ##added imports
 import copy
@@ -419,7 +419,7 @@ class TSP_World(GA_World):
                 if gui_get('Animate construction'):
                     for lnk in path_links:
                         lnk.set_color(Color('red'))
-                    World.links = set()
+                    World.links.clear()
                     draw_links(msp_links + path_links, World.links)
             self.population.append(new_individual)
 
@@ -490,7 +490,7 @@ class TSP_World(GA_World):
     def set_results(self):
         super().set_results()
         best_chromosome: TSP_Chromosome = self.best_ind.chromosome
-        World.links = set(seq_to_links(best_chromosome))
+        World.links = LinkSet(seq_to_links(best_chromosome))
 
         # Never stop
         self.done = False
@@ -1,17 +1,54 @@
 
 from random import randint
 
+import numpy as np
+
+from Examples.life_engines import ENGINES
 from core.gui import HOR_SEP
 from core.on_off import OnOffPatch, OnOffWorld, on_off_left_upper
 from core.sim_engine import gui_get
+from core.world_patch_block import PatchVariable, World
+
+# The default engine: Life_World.step_patches.
+NUMPY = 'numpy'
+
+ADVANCE = 'Advance'
+
+
+def live_neighbor_counts(board: np.ndarray) -> np.ndarray:
+    """
+    The number of live neighbors of each cell of board, a uint8 array of 0's and 1's. The board is a torus,
+    as in RowCol.wrap. The 3x3 sums are taken as shifted copies along the rows and then along the columns,
+    which takes four np.rolls rather than eight. Subtracting the cell itself leaves its neighbors.
+    """
+    rows_3 = board + np.roll(board, 1, axis=0) + np.roll(board, -1, axis=0)
+    block_3x3 = rows_3 + np.roll(rows_3, 1, axis=1) + np.roll(rows_3, -1, axis=1)
+    return block_3x3 - board
+
+
+def next_generation(board: np.ndarray, live_neighbors: np.ndarray) -> np.ndarray:
+    """ Alive next: 3 live neighbors, or alive now and 2 live neighbors. Returns a uint8 board. """
+    return ((live_neighbors == 3) | (board.astype(bool) & (live_neighbors == 2))).view(np.uint8)
 
 
 class Life_Patch(OnOffPatch):
 
+    live_neighbors = PatchVariable(int, 0)
+
     def __init__(self, *args, **kw_args):
         super().__init__(*args, **kw_args)
         self.live_neighbors = 0
 
+    # Life_World.step updates is_on and World.patch_colors for all the patches at once, without
+    # touching the Life_Patch objects. So a Life_Patch's color is computed from is_on when asked for.
+    @property
+    def color(self):
+        return OnOffPatch.on_color if self.is_on else OnOffPatch.off_color
+
+    @color.setter
+    def color(self, _color):
+        pass
+
     def is_alive(self):
         return self.is_on
 
@@ -23,6 +60,36 @@ class Life_Patch(OnOffPatch):
 
 
 class Life_World(OnOffWorld):
+    """
+    The engine chooser picks how generations are computed. With NUMPY, the patch arrays themselves are
+    stepped (see step_patches). Otherwise the board is handed to one of the engines in life_engines,
+    which keeps its own copy, and only the part of it the patches show is copied back after each advance.
+    The Advance button jumps the number of generations in the box next to it.
+    """
+
+    # The life_engines engine in use, or None for NUMPY.
+    engine = None
+
+    def advance(self, nbr_generations):
+        if self.engine:
+            self.engine.advance(nbr_generations)
+            (rows, cols) = Life_Patch.is_on.array.shape
+            self.show_board(self.engine.window(rows, cols))
+        else:
+            for _ in range(nbr_generations):
+                self.step_patches()
+
+    def handle_event(self, event):
+        if event == ADVANCE:
+            self.advance(int(gui_get('generations')))
+        else:
+            super().handle_event(event)
+
+    def mouse_click(self, xy):
+        super().mouse_click(xy)
+        if self.engine:
+            patch = self.pixel_tuple_to_patch(xy)
+            self.engine.set_cell(*patch.array_index, patch.is_on)
 
     def setup(self):
         super().setup()
@@ -30,16 +97,36 @@ class Life_World(OnOffWorld):
         for patch in self.patches:
             is_alive = randint(0, 100) < density
             patch.set_alive_or_dead(is_alive)
+        engine_class = ENGINES.get(gui_get('engine'))
+        self.engine = engine_class(Life_Patch.is_on.array.view(np.uint8)) if engine_class else None
+
+    @staticmethod
+    def show_board(board):
+        """
+        Make board, a uint8 array of 0's and 1's, the patches' is_on, and color all the patches at once
+        by writing World.patch_colors, which World.draw_patches puts on the screen with one blit.
+        """
+        Life_Patch.is_on.array[:] = board
+        # Row 0 of the palette is the off color; row 1 is the on color.
+        palette = np.array([OnOffPatch.off_color[:3], OnOffPatch.on_color[:3]], dtype=np.uint8)
+        np.take(palette, board, axis=0, out=World.patch_colors)
+        # The patches were changed behind their backs, so their dirty flags don't say which ones to redraw.
+        World.full_redraw = True
 
     def step(self):
-        # Count the live neighbors in the current state.
-        for patch in self.patches:
-            patch.count_live_neighbors()
+        self.advance(1)
 
-        # Determine and set whether each patch is_alive in the next state.
-        for patch in self.patches:
-            is_alive = patch.live_neighbors == 3 or patch.is_alive() and patch.live_neighbors == 2
-            patch.set_alive_or_dead(is_alive)
+    def step_patches(self):
+        """ Compute the next generation for the whole board as a uint8 array. """
+        # is_on is a bool array. Viewed as uint8, it is the board of 0's and 1's.
+        board = Life_Patch.is_on.array.view(np.uint8)
+
+        # Count the live neighbors in the current state, for all patches at once.
+        live_neighbors = live_neighbor_counts(board)
+        Life_Patch.live_neighbors.array[:] = live_neighbors
+
+        # Determine whether each patch is_alive in the next state.
+        self.show_board(next_generation(board, live_neighbors))
 
 
 # ############################################## Define GUI ############################################## #
@@ -52,6 +139,12 @@ gol_left_upper = [[sg.Text('Initial density'),
                   HOR_SEP(pad=((0, 0), (0, 0))),
                   [sg.Text('Cells can be toggled when\nthe system is stopped.')],
                   HOR_SEP(pad=((0, 0), (0, 0))),
+                  [sg.Text('Engine'),
+                   sg.Combo([NUMPY] + list(ENGINES), key='engine', default_value=NUMPY,
+                            tooltip='How generations are computed. Takes effect at setup.')],
+                  [sg.Button(ADVANCE), sg.Input(default_text='1000', key='generations', size=(10, 1)),
+                   sg.Text('generations')],
+                  HOR_SEP(pad=((0, 0), (0, 0))),
                   ] + \
                   on_off_left_upper
 
@@ -0,0 +1,270 @@
+"""
+Game of Life engines for long runs of Life_World (see game_of_life.py). Neither keeps per-patch objects.
+
+BitBoardLife    The board is a single Python int with one bit per cell, row after row. A generation is
+                computed for all the cells at once with a few dozen whole-board shifts, ands, ors and xors:
+                the neighbor counts are added up bitwise, as in a hardware adder (SWAR). The board is a
+                torus, as in RowCol.wrap, so it computes the same generations as Life_World.step.
+HashLife        Gosper's HashLife. The universe is a quadtree whose nodes are shared and whose results
+                are memoized, so sparse and periodic patterns can be advanced millions of generations
+                in a single call. The universe is the unbounded plane: the board is the window onto
+                it whose upper left cell is (0, 0), and patterns that leave the window don't wrap around.
+
+Both are created from a board, a uint8 array of 0's and 1's of shape (rows, cols), and have
+    advance(n)                  advance n generations,
+    set_cell(row, col, alive)   change a cell, e.g., when the user clicks a patch,
+    window(rows, cols)          the cells in rows range(rows) and cols range(cols) as a uint8 array.
+Only the window is ever turned back into an array.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+import core.cache_registry as cache_registry
+
+
+class BitBoardLife:
+
+    def __init__(self, board: np.ndarray):
+        (self.rows, self.cols) = board.shape
+        self.nbr_cells = self.rows * self.cols
+        self.nbr_bytes = (self.nbr_cells + 7) // 8
+        self.all_cells = (1 << self.nbr_cells) - 1
+        # Bit 0 of every row, i.e., the cells in column 0: the sum of 2**(row*cols), a repunit in base 2**cols.
+        self.first_col = self.all_cells // ((1 << self.cols) - 1)
+        self.last_col = self.first_col << (self.cols - 1)
+        self.cells = int.from_bytes(np.packbits(board.ravel().astype(bool), bitorder='little').tobytes(), 'little')
+        self.generation = 0
+
+    def advance(self, n):
+        for _ in range(n):
+            self.cells = self.next_generation(self.cells)
+        self.generation += n
+
+    def east(self, cells):
+        """ The board whose cell (r, c) is cell (r, c+1) of cells, wrapping around the right edge. """
+        return (cells >> 1) & (self.all_cells ^ self.last_col) | (cells << (self.cols - 1)) & self.last_col
+
+    def next_generation(self, cells):
+        """
+        Each neighbor board is added into a bit-sliced count: ones and twos are the count's two low bits,
+        and fours is set for good once a count reaches 4, since the cell is then dead whatever follows.
+        """
+        row_shift = self.cols
+        wrap_shift = self.nbr_cells - row_shift
+        all_cells = self.all_cells
+        (west, east) = (self.west(cells), self.east(cells))
+        ones = twos = fours = 0
+        for row in (cells, west, east):
+            north = (row << row_shift | row >> wrap_shift) & all_cells
+            south = (row >> row_shift | row << wrap_shift) & all_cells
+            neighbors = (north, south) if row is cells else (row, north, south)
+            for neighbor in neighbors:
+                carry = ones & neighbor
+                ones ^= neighbor
+                fours |= twos & carry
+                twos ^= carry
+        # Alive next: a count of 3, or a count of 2 and alive now.
+        return twos & (ones | cells) & (all_cells ^ fours)
+
+    def set_cell(self, row, col, alive):
+        bit = 1 << (row * self.cols + col)
+        self.cells = self.cells | bit if alive else self.cells & ~bit
+
+    def west(self, cells):
+        """ The board whose cell (r, c) is cell (r, c-1) of cells, wrapping around the left edge. """
+        return (cells << 1) & (self.all_cells ^ self.first_col) | (cells >> (self.cols - 1)) & self.first_col
+
+    def window(self, rows, cols):
+        bits = np.unpackbits(np.frombuffer(self.cells.to_bytes(self.nbr_bytes, 'little'), dtype=np.uint8),
+                             bitorder='little')
+        return bits[:self.nbr_cells].reshape(self.rows, self.cols)[:rows, :cols]
+
+
+# ############################################## HashLife ############################################## #
+
+# A quadtree node of level k covers 2**k x 2**k cells. nw, ne, sw, and se are its quadrants, of level k-1.
+# population is its number of live cells. Nodes are built only by join(), so equal nodes are the same
+# object, and hash is computed once from the quadrants' hashes.
+_Node = namedtuple('_Node', ['k', 'nw', 'ne', 'sw', 'se', 'population', 'hash'])
+
+
+class Node(_Node):
+
+    __slots__ = ()
+
+    def __hash__(self):
+        return self.hash
+
+
+OFF = Node(0, None, None, None, None, 0, 0)
+ON = Node(0, None, None, None, None, 1, 1)
+
+
+@cache_registry.cached(maxsize=2**22)
+def join(nw, ne, sw, se):
+    """ The node whose quadrants are nw, ne, sw, and se. """
+    population = nw.population + ne.population + sw.population + se.population
+    node_hash = (nw.k + 2 + 5131830419411 * nw.hash + 3758991985019 * ne.hash +
+                 8973110871315 * sw.hash + 4318490180473 * se.hash) & ((1 << 63) - 1)
+    return Node(nw.k + 1, nw, ne, sw, se, population, node_hash)
+
+
+@cache_registry.cached(maxsize=64)
+def empty_node(k):
+    return OFF if k == 0 else join(*[empty_node(k - 1)] * 4)
+
+
+def centered(node):
+    """ The node of level k+1 with node in its middle and empty space around it. """
+    empty = empty_node(node.k - 1)
+    return join(join(empty, empty, empty, node.nw), join(empty, empty, node.ne, empty),
+                join(empty, node.sw, empty, empty), join(node.se, empty, empty, empty))
+
+
+def is_padded(node):
+    """ Are all the live cells in the middle half (in each direction) of node? """
+    return (node.nw.population == node.nw.se.se.population and
+            node.ne.population == node.ne.sw.sw.population and
+            node.sw.population == node.sw.ne.ne.population and
+            node.se.population == node.se.nw.nw.population)
+
+
+def life_rule(nw, n, ne, w, center, e, sw, s, se):
+    """ The next state of center, given its 8 neighbors. All are nodes of level 0. """
+    live_neighbors = (nw.population + n.population + ne.population + w.population +
+                      e.population + sw.population + s.population + se.population)
+    return ON if live_neighbors == 3 or center.population and live_neighbors == 2 else OFF
+
+
+def life_4x4(m):
+    """ The middle 2x2 cells of m, a node of level 2, one generation on. """
+    return join(life_rule(m.nw.nw, m.nw.ne, m.ne.nw, m.nw.sw, m.nw.se, m.ne.sw, m.sw.nw, m.sw.ne, m.se.nw),
+                life_rule(m.nw.ne, m.ne.nw, m.ne.ne, m.nw.se, m.ne.sw, m.ne.se, m.sw.ne, m.se.nw, m.se.ne),
+                life_rule(m.nw.sw, m.nw.se, m.ne.sw, m.sw.nw, m.sw.ne, m.se.nw, m.sw.sw, m.sw.se, m.se.sw),
+                life_rule(m.nw.se, m.ne.sw, m.ne.se, m.sw.ne, m.se.nw, m.se.ne, m.sw.se, m.se.sw, m.se.se))
+
+
+@cache_registry.cached(maxsize=2**22)
+def successor(m, j):
+    """
+    The middle node of m (level k-1) 2**j generations on, for j <= k-2. The middle of m is made from
+    nine overlapping nodes of level k-1. Each is advanced by a recursive call. Their results are combined
+    either directly, if j < k-2, or, if j == k-2, after a second round of advancing, for 2**(k-2) in all.
+    """
+    if m.population == 0:
+        return m.nw
+    if m.k == 2:
+        return life_4x4(m)
+    j = min(j, m.k - 2)
+    (nw, ne, sw, se) = (m.nw, m.ne, m.sw, m.se)
+    c1 = successor(nw, j)
+    c2 = successor(join(nw.ne, ne.nw, nw.se, ne.sw), j)
+    c3 = successor(ne, j)
+    c4 = successor(join(nw.sw, nw.se, sw.nw, sw.ne), j)
+    c5 = successor(join(nw.se, ne.sw, sw.ne, se.nw), j)
+    c6 = successor(join(ne.sw, ne.se, se.nw, se.ne), j)
+    c7 = successor(sw, j)
+    c8 = successor(join(sw.ne, se.nw, sw.se, se.sw), j)
+    c9 = successor(se, j)
+    if j < m.k - 2:
+        return join(join(c1.se, c2.sw, c4.ne, c5.nw), join(c2.se, c3.sw, c5.ne, c6.nw),
+                    join(c4.se, c5.sw, c7.ne, c8.nw), join(c5.se, c6.sw, c8.ne, c9.nw))
+    return join(successor(join(c1, c2, c4, c5), j), successor(join(c2, c3, c5, c6), j),
+                successor(join(c4, c5, c7, c8), j), successor(join(c5, c6, c8, c9), j))
+
+
+def node_from_array(cells: np.ndarray, k):
+    """ The node of level k for cells, a 2**k x 2**k array. Empty regions become the shared empty nodes. """
+    if not cells.any():
+        return empty_node(k)
+    if k == 0:
+        return ON
+    half = 1 << (k - 1)
+    return join(node_from_array(cells[:half, :half], k - 1), node_from_array(cells[:half, half:], k - 1),
+                node_from_array(cells[half:, :half], k - 1), node_from_array(cells[half:, half:], k - 1))
+
+
+class HashLife:
+
+    def __init__(self, board: np.ndarray):
+        (rows, cols) = board.shape
+        k = max(3, (max(rows, cols) - 1).bit_length())
+        padded = np.zeros((1 << k, 1 << k), dtype=np.uint8)
+        padded[:rows, :cols] = board
+        self.root = node_from_array(padded, k)
+        # The universe coordinates of the root's upper left cell.
+        (self.row, self.col) = (0, 0)
+        self.generation = 0
+
+    def advance(self, n):
+        """
+        Advance by 2**j generations for each bit j of n, largest first. Before each jump, the root is grown
+        until its live cells are in its middle quarter and it is at least level j+3. Cells move at most one
+        cell per generation, so in 2**j generations none can leave the middle half, which successor returns.
+        """
+        for j in reversed(range(n.bit_length())):
+            if not n >> j & 1:
+                continue
+            while self.root.k < j + 3 or not is_padded(self.root):
+                self.grow()
+            offset = 1 << (self.root.k - 2)
+            self.root = successor(self.root, j)
+            (self.row, self.col) = (self.row + offset, self.col + offset)
+        self.generation += n
+
+    def grow(self):
+        offset = 1 << (self.root.k - 1)
+        self.root = centered(self.root)
+        (self.row, self.col) = (self.row - offset, self.col - offset)
+
+    def set_cell(self, row, col, alive):
+        size = 1 << self.root.k
+        while not (self.row <= row < self.row + size and self.col <= col < self.col + size):
+            self.grow()
+            size = 1 << self.root.k
+        self.root = self.with_cell(self.root, row - self.row, col - self.col, ON if alive else OFF)
+
+    def window(self, rows, cols):
+        cells = np.zeros((rows, cols), dtype=np.uint8)
+        self.fill_window(cells, self.root, self.row, self.col)
+        return cells
+
+    @staticmethod
+    def fill_window(cells, node, row, col):
+        """ Copy the live cells of node, whose upper left cell is (row, col), that fall in cells. """
+        (rows, cols) = cells.shape
+        size = 1 << node.k
+        if node.population == 0 or row >= rows or col >= cols or row + size <= 0 or col + size <= 0:
+            return
+        if node.k == 0:
+            cells[row, col] = 1
+            return
+        half = size >> 1
+        HashLife.fill_window(cells, node.nw, row, col)
+        HashLife.fill_window(cells, node.ne, row, col + half)
+        HashLife.fill_window(cells, node.sw, row + half, col)
+        HashLife.fill_window(cells, node.se, row + half, col + half)
+
+    @staticmethod
+    def with_cell(node, row, col, cell):
+        """ node with its cell at (row, col), relative to its upper left cell, replaced by cell. """
+        if node.k == 0:
+            return cell
+        half = 1 << (node.k - 1)
+        (nw, ne, sw, se) = (node.nw, node.ne, node.sw, node.se)
+        if row < half:
+            if col < half:
+                nw = HashLife.with_cell(nw, row, col, cell)
+            else:
+                ne = HashLife.with_cell(ne, row, col - half, cell)
+        elif col < half:
+            sw = HashLife.with_cell(sw, row - half, col, cell)
+        else:
+            se = HashLife.with_cell(se, row - half, col - half, cell)
+        return join(nw, ne, sw, se)
+
+
+# The engines by the names in Life_World's engine chooser.
+ENGINES = {'bit-packed': BitBoardLife, 'hashlife': HashLife}
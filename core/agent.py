@@ -9,12 +9,13 @@ from pygame import Surface
 from pygame.color import Color
 from pygame.colordict import THECOLORS
 
+import core.cache_registry as cache_registry
 import core.gui as gui
 import core.pairs as pairs
 import core.utils as utils
-from core.gui import HALF_PATCH_SIZE, PATCH_SIZE, SHAPES
+from core.gui import CIRCLE, HALF_PATCH_SIZE, NODE, SHAPES
 from core.pairs import Pixel_xy, RowCol, Velocity, XY, heading_and_speed_to_velocity
-from core.sim_engine import gui_get
+from core.sim_engine import gui_params
 from core.world_patch_block import Block, Patch, World
 
 
@@ -39,6 +40,31 @@ NETLOGO_PRIMARY_COLORS = [(color_name, Color(color_name))
 SQRT_2 = sqrt(2)
 
 
+@cache_registry.cached(maxsize=4096)
+def rotated_sprite(shape_name, rgb, scale, heading, patch_size):
+    """
+    The image of a shape_name agent of color rgb and this scale, rotated to heading. Agents that look
+    alike share one image, so don't draw on it. patch_size (gui.PATCH_SIZE) sets the size of the image.
+    """
+    return pgt.rotate(shape_sprite(shape_name, rgb, scale, patch_size), -heading)
+
+
+@cache_registry.cached(maxsize=256)
+def shape_sprite(shape_name, rgb, scale, patch_size):
+    """ The unrotated image, with heading 0, for rotated_sprite. It too is shared. """
+    # Give the agent a larger Surface (by sqrt(2)) to work with since it may rotate.
+    # A per-pixel-alpha Surface is transparent where the shape isn't. Otherwise it would be black and
+    # would cover nearby agents. (convert_alpha() needs a pygame display and so isn't available headless.)
+    sprite = Surface(XY((patch_size, patch_size))*SQRT_2, pg.SRCALPHA)
+    sprite.fill((0, 0, 0, 0))
+    factor = scale * patch_size
+    if shape_name in SHAPES:
+        # Instead of using pygame's smoothscale to scale the image, scale the polygon instead.
+        scaled_shape = [(v[0]*factor,  v[1]*factor) for v in SHAPES[shape_name]]
+        pg.draw.polygon(sprite, rgb, scaled_shape, 0)
+    return sprite
+
+
 class Agent(Block):
 
     color_palette = choice([NETLOGO_PRIMARY_COLORS, PYGAME_COLORS])
@@ -83,17 +109,27 @@ class Agent(Block):
         self.heading = randint(0, 359)
         self.velocity = Velocity.velocity_00
 
+    def __lt__(self, other):
+        # Undirected links order their two agents. See Link.__init__.
+        return self.id < other.id
+
     def __str__(self):
         class_name = utils.get_class_name(self)
         return f'{class_name}-{self.id}{tuple(self.center_pixel.round())}'
 
     def agents_in_radius(self, distance):
-        qualifying_agents = [agent for agent in World.agents
+        """
+        The other agents closer than distance (in pixels). Patch.agents already groups the agents by patch,
+        so only the patches within distance of this agent's patch are searched.
+        """
+        cell_radius = int(distance // gui.BLOCK_SPACING()) + 1
+        nearby_patches = World.patches_around(self.current_patch(), cell_radius, wrap=pairs.world_wraps())
+        qualifying_agents = [agent for patch in nearby_patches for agent in patch.agents
                              if agent is not self and self.distance_to(agent) < distance]
         return qualifying_agents
 
     def all_links(self):
-        return [lnk for lnk in World.links if self in (lnk.agent_1, lnk.agent_2)]
+        return list(World.links.links_of(self))
 
     def average_of_headings(self, agent_set, fn):
         """
@@ -106,6 +142,15 @@ class Agent(Block):
         dy = mean([utils.dy(fn(agent)) for agent in agent_set])
         return utils.dxdy_to_heading(dx, dy, default_heading=self.heading)
 
+    def batch_radius(self):
+        """
+        If World.draw can draw this agent along with others as a plain circle (see gui.draw_circles),
+        its radius. Otherwise None.
+        """
+        if self.shape_name in (CIRCLE, NODE) and not self.label and type(self).draw is Agent.draw:
+            return gui.circle_radius(self, self.shape_name)
+        return None
+
     def bounce_off_screen_edge(self, dxdy):
         """
        Bounce agent off the screen edges. dxdv is the current agent velocity.
@@ -125,29 +170,7 @@ class Agent(Block):
         return dxdy
 
     def create_base_image(self):
-        base_image = self.create_blank_base_image()
-
-        factor = self.scale * PATCH_SIZE
-        if self.shape_name in SHAPES:
-            # Instead of using pygame's smoothscale to scale the image, scale the polygon instead.
-            scaled_shape = [(v[0]*factor,  v[1]*factor) for v in SHAPES[self.shape_name]]
-            pg.draw.polygon(base_image, self.color, scaled_shape, 0)
-        return base_image
-
-    def create_blank_base_image(self):
-
-        # Give the agent a larger Surface (by sqrt(2)) to work with since it may rotate.
-        surface_size = XY((self.rect.width, self.rect.height))*SQRT_2
-        blank_base_image = Surface(surface_size)
-
-        # This sets the rectangle to be transparent.
-        # Otherwise it would be black and would cover nearby agents.
-        # Even though it's a method of Surface, it can also take a Surface parameter.
-        # If the Surface parameter is not given, PyCharm complains.
-        # noinspection PyArgumentList
-        blank_base_image = blank_base_image.convert_alpha()
-        blank_base_image.fill((0, 0, 0, 0))
-        return blank_base_image
+        return shape_sprite(self.shape_name, tuple(self.color)[:3], self.scale, gui.PATCH_SIZE)
 
     def current_patch(self) -> Patch:
         row_col: RowCol = (self.center_pixel).pixel_to_row_col()
@@ -155,9 +178,11 @@ class Agent(Block):
         return patch
 
     def delete(self):
+        if self.drawn_rect:
+            World.dirty_rects.append(self.drawn_rect)
         self.current_patch().remove_agent(self)
         World.agents.remove(self)
-        World.links -= {lnk for lnk in World.links if lnk.includes(self)}
+        World.links -= World.links.links_of(self)
 
     def distance_to(self, other):
         dist = self.distance_to_pixel(other.center_pixel)
@@ -172,7 +197,8 @@ class Agent(Block):
     def draw(self, shape_name=None):
         # No point in rotating circles or nodes. Only rotate SHAPES.
         if self.shape_name in SHAPES:
-            self.image = pgt.rotate(self.base_image, -self.heading)
+            self.image = rotated_sprite(self.shape_name, tuple(self.color)[:3], self.scale, self.heading,
+                                        gui.PATCH_SIZE)
             self.rect = self.image.get_rect(center=self.center_pixel)
         super().draw(shape_name=self.shape_name)
 
@@ -192,13 +218,13 @@ class Agent(Block):
         return from_pixel.heading_toward(to_pixel)
 
     def in_links(self):
-        return [lnk for lnk in World.links if lnk.directed and lnk.agent_2 is self]
+        return [lnk for lnk in World.links.links_of(self) if lnk.directed and lnk.agent_2 is self]
 
     def lnk_nbrs(self):
         """
         Return a list of links from this node and the nodes to which they attach.
         """
-        lns = [(lnk, lnk.other_side()) for lnk in World.links if lnk.includes(self)]
+        lns = [(lnk, lnk.other_side(self)) for lnk in World.links.links_of(self)]
         return lns
 
     def move_by_dxdy(self, dxdy: Velocity):
@@ -212,7 +238,7 @@ class Agent(Block):
         self.move_to_xy(new_center_pixel_wrapped)
 
     def move_by_velocity(self):
-        if gui_get('Bounce?'):
+        if gui_params().bounce:
             new_velocity = self.bounce_off_screen_edge(self.velocity)
             if self.velocity != new_velocity:
                 self.set_velocity(new_velocity)
@@ -241,8 +267,30 @@ class Agent(Block):
         new_patch = self.current_patch()
         new_patch.add_agent(self)
 
+    def nearest_agents(self, k=1):
+        """
+        The (at most) k other agents closest to this one, closest first.
+        Search squares of patches of increasing size around this agent's patch. An agent on a patch outside
+        a square with cell_radius r is more than r*BLOCK_SPACING() pixels away, so stop as soon as the k-th
+        closest agent found so far is nearer than that, or when the square covers the board.
+        """
+        wrap = pairs.world_wraps()
+        current_patch = self.current_patch()
+        # A square with this cell_radius covers the board from any patch.
+        board_radius = max(gui.PATCH_ROWS, gui.PATCH_COLS)
+        cell_radius = 1
+        while True:
+            nearby_patches = World.patches_around(current_patch, cell_radius, wrap=wrap)
+            candidates = sorted(((self.distance_to(agent), agent.id, agent) for patch in nearby_patches
+                                 for agent in patch.agents if agent is not self))
+            closest = [agent for (_dist, _id, agent) in candidates[:k]]
+            if cell_radius >= board_radius or \
+               len(candidates) >= k and candidates[k-1][0] <= cell_radius * gui.BLOCK_SPACING():
+                return closest
+            cell_radius *= 2
+
     def out_links(self):
-        return [lnk for lnk in World.links if lnk.directed and lnk.agent_1 is self]
+        return [lnk for lnk in World.links.links_of(self) if lnk.directed and lnk.agent_1 is self]
 
     @staticmethod
     def run_an_animation_step():
@@ -257,14 +305,17 @@ class Agent(Block):
         self.center_pixel: Pixel_xy = xy.wrap()
         # Set the center point of this agent's rectangle.
         self.rect.center = (self.center_pixel - Agent.half_patch_pixel).round()
+        self.dirty = True
 
     def set_color(self, color):
         self.color = color
         self.base_image = self.create_base_image()
+        self.dirty = True
 
     def set_heading(self, heading):
         # Keep heading as an int in range(360)
         self.heading = int(round(heading))
+        self.dirty = True
 
     def set_target_by_dxdy(self, velocity):
         self.animation_target = self.center_pixel + velocity
@@ -315,18 +366,46 @@ class Turtle(Agent):
 
 
 # The Pylogo fuction that starts the simulation
+from core.recorder import FrameRecorder
 from core.sim_engine import SimEngine
+from core.tick_profiler import TickProfiler
 
 
 def PyLogo(world_class=World, caption=None, gui_left_upper=None, gui_right_upper=None,
            agent_class=Agent, patch_class=Patch, auto_setup=True,
-           patch_size=11, board_rows_cols=(51, 51), clear=None, bounce=None, fps=None):
+           patch_size=11, board_rows_cols=(51, 51), clear=None, bounce=None, fps=None,
+           headless=False, params=None, max_ticks=None, render=False,
+           record_to=None, record_every=1, record_format='png', steps_per_frame=1, frame_budget=None,
+           profile=False, cache_sizes=None):
+    """
+    If headless, there is no window. The widget values come from the layout defaults overridden by params,
+    and the world runs for max_ticks ticks (or until world.done). The world is returned when the run ends.
+
+    If record_to names a directory, every record_every ticks a frame is written there in record_format,
+    'png' or 'raw'. See core.recorder.
+
+    steps_per_frame and frame_budget let the model take many steps per screen update. See SimEngine.frame_budget.
+
+    If profile, the time spent in each phase of each tick is recorded. See core.tick_profiler.
+
+    cache_sizes maps cache names to sizes, e.g., {'core.agent.rotated_sprite': 8192}. See core.cache_registry.
+    """
     if gui_left_upper is None:
         gui_left_upper = []
     if caption is None:
         caption = utils.extract_class_name(world_class)
     sim_engine = SimEngine(gui_left_upper, caption=caption, gui_right_upper=gui_right_upper,
-                           patch_size=patch_size, board_rows_cols=board_rows_cols, clear=clear, bounce=bounce, fps=fps)
+                           patch_size=patch_size, board_rows_cols=board_rows_cols, clear=clear, bounce=bounce, fps=fps,
+                           headless=headless, params=params, steps_per_frame=steps_per_frame,
+                           frame_budget=frame_budget)
+    if cache_sizes:
+        cache_registry.configure(cache_sizes)
+    SimEngine.profiler = TickProfiler() if profile else None
+    SimEngine.recorder = FrameRecorder(record_to, every=record_every, frame_format=record_format) if record_to else None
+    if headless:
+        the_world = world_class(patch_class, agent_class)
+        return sim_engine.run_headless(the_world, max_ticks=max_ticks, render=render)
+
     gui.WINDOW.read(timeout=10)
 
     the_world = world_class(patch_class, agent_class)
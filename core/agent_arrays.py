@@ -0,0 +1,213 @@
+"""
+An optional struct-of-arrays backend for agents.
+
+An ArrayAgent keeps its position, heading, speed, and color in the numpy arrays of the World's AgentStore
+rather than in its own attributes. The usual Agent methods (forward, move_to_xy, set_heading, ...) work
+on a single agent as before, through properties that read and write its slot in the arrays. The batch
+operations on the store (forward_all, turn_all, wrap_all, bounce_all) move all the agents in one
+vectorized call per tick and then update Patch.agents for just the agents that changed patches.
+
+The batch operations do not maintain the (NetLogo-less) Agent.velocity attribute.
+"""
+
+import numpy as np
+from pygame.color import Color
+
+import core.gui as gui
+import core.utils as utils
+from core.agent import Agent
+from core.pairs import Pixel_xy
+from core.sim_engine import gui_params
+from core.world_patch_block import World
+
+
+class AgentStore:
+    """
+    The columns for all the ArrayAgents. Slots [0, len(self)) are in use; self.agents[i] owns slot i.
+    When an agent is deleted, the last agent is moved into its slot so that the used slots stay contiguous.
+    """
+
+    def __init__(self, capacity=64):
+        self.agents = []
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.heading = np.zeros(capacity, dtype=np.int32)
+        self.speed = np.ones(capacity)
+        self.rgb = np.zeros((capacity, 3), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.agents)
+
+    def add(self, agent):
+        """ Give agent a slot. Returns the slot number. """
+        if len(self.agents) == len(self.x):
+            self.grow()
+        self.agents.append(agent)
+        return len(self.agents) - 1
+
+    def bounce_all(self, distance):
+        """
+        Turn the agents that would leave the board by moving forward distance, as Agent.bounce_off_screen_edge
+        does one agent at a time: reverse dy for those that would cross the top or bottom and dx for those
+        that would cross the left or right side.
+        """
+        self.mark_dirty(self.bounce_headings(distance))
+
+    def bounce_headings(self, distance):
+        """ The heading changes of bounce_all, without marking the agents dirty. Returns the turned agents' mask. """
+        n = len(self)
+        (dx, dy) = self.unit_dxdy()
+        spacing = gui.BLOCK_SPACING()
+        next_rows = (self.y[:n] + dy*distance) // spacing
+        next_cols = (self.x[:n] + dx*distance) // spacing
+        flip_dy = (next_rows < 0) | (gui.PATCH_ROWS <= next_rows)
+        flip_dx = (next_cols < 0) | (gui.PATCH_COLS <= next_cols)
+        # Reversing dy reflects the heading across the horizontal: h -> 180 - h. Reversing dx: h -> -h.
+        heading = self.heading[:n]
+        heading[flip_dy] = 180 - heading[flip_dy]
+        heading[flip_dx] = -heading[flip_dx]
+        heading %= 360
+        return flip_dy | flip_dx
+
+    def clear(self):
+        self.agents = []
+
+    def forward_all(self, distance=None, bounce=None):
+        """
+        Move every agent forward in its heading direction, by distance or, if distance is None,
+        by its own speed. If bounce (by default, the 'Bounce?' checkbox), first turn the agents that
+        would go off the board, as Agent.move_by_velocity does. Then wrap and update Patch.agents.
+        Only the agents that moved or turned are marked dirty.
+        """
+        n = len(self)
+        if distance is None:
+            distance = self.speed[:n]
+        if bounce is None:
+            bounce = gui_params().bounce
+        (old_rows, old_cols) = self.rows_cols()
+        (old_x, old_y) = (self.x[:n].copy(), self.y[:n].copy())
+        turned = self.bounce_headings(distance) if bounce else False
+        (dx, dy) = self.unit_dxdy()
+        self.x[:n] += dx * distance
+        self.y[:n] += dy * distance
+        self.wrap_all()
+        self.update_patches(old_rows, old_cols)
+        self.mark_dirty(turned | (self.x[:n] != old_x) | (self.y[:n] != old_y))
+
+    def grow(self):
+        capacity = 2 * len(self.x)
+        for name in ['x', 'y', 'heading', 'speed', 'rgb']:
+            old_column = getattr(self, name)
+            new_column = np.zeros((capacity, ) + old_column.shape[1:], dtype=old_column.dtype)
+            new_column[:len(old_column)] = old_column
+            setattr(self, name, new_column)
+
+    def mark_dirty(self, changed):
+        """
+        The batch operations bypass the Agent methods that mark an agent dirty. See World.draw_dirty.
+        changed is a boolean array with one entry per agent.
+        """
+        agents = self.agents
+        for i in np.flatnonzero(changed).tolist():
+            agents[i].dirty = True
+
+    def release(self, slot):
+        """ Free slot. The last agent moves into it. """
+        last = len(self.agents) - 1
+        last_agent = self.agents.pop()
+        if slot != last:
+            for column in [self.x, self.y, self.heading, self.speed, self.rgb]:
+                column[slot] = column[last]
+            self.agents[slot] = last_agent
+            last_agent.slot = slot
+
+    def rows_cols(self):
+        """ The patch row and col of each agent, as Pixel_xy.pixel_to_row_col computes them. """
+        n = len(self)
+        spacing = gui.BLOCK_SPACING()
+        return ((self.y[:n] // spacing).astype(np.int32), (self.x[:n] // spacing).astype(np.int32))
+
+    def turn_all(self, delta_angles):
+        """ Turn every agent right by delta_angles, a number or an array with one entry per agent. """
+        n = len(self)
+        old_heading = self.heading[:n].copy()
+        self.heading[:n] = np.rint(self.heading[:n] + delta_angles).astype(np.int32) % 360
+        self.mark_dirty(self.heading[:n] != old_heading)
+
+    def unit_dxdy(self):
+        """ The unit (dx, dy) for each agent's heading. Heading 0 is up; the y-axis points down. """
+        headings = self.heading[:len(self)]
+        return (utils.DX_ARRAY[headings], utils.DY_ARRAY[headings])
+
+    def update_patches(self, old_rows, old_cols):
+        """ Move the agents whose patch changed from the old patch's agents to the new patch's agents. """
+        (new_rows, new_cols) = self.rows_cols()
+        moved = np.flatnonzero((new_rows != old_rows) | (new_cols != old_cols))
+        patches_array = World.patches_array
+        for i in moved.tolist():
+            agent = self.agents[i]
+            patches_array[old_rows[i], old_cols[i]].remove_agent(agent)
+            patches_array[new_rows[i], new_cols[i]].add_agent(agent)
+
+    def wrap_all(self):
+        """ Wrap all positions around the board, as Pixel_xy.wrap does. """
+        n = len(self)
+        screen_rect = gui.SCREEN.get_rect()
+        self.x[:n] %= screen_rect.w - 1
+        self.y[:n] %= screen_rect.h - 1
+
+
+class ArrayAgent(Agent):
+    """
+    An Agent whose center_pixel, heading, speed, and color live in World.agent_store.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if World.agent_store is None:
+            World.agent_store = AgentStore()
+        # The slot must exist before Agent.__init__ sets the position, heading, and color.
+        self.slot = World.agent_store.add(self)
+        super().__init__(*args, **kwargs)
+
+    def delete(self):
+        super().delete()
+        World.agent_store.release(self.slot)
+
+    def draw(self, shape_name=None):
+        # The batch operations move the agent without going through set_center_pixel, which sets rect.
+        self.rect.center = (self.center_pixel - Agent.half_patch_pixel).round()
+        super().draw(shape_name=shape_name)
+
+    @property
+    def center_pixel(self):
+        store = World.agent_store
+        return Pixel_xy((store.x.item(self.slot), store.y.item(self.slot)))
+
+    @center_pixel.setter
+    def center_pixel(self, xy):
+        store = World.agent_store
+        (store.x[self.slot], store.y[self.slot]) = xy
+
+    @property
+    def color(self):
+        return Color(*World.agent_store.rgb[self.slot].tolist())
+
+    @color.setter
+    def color(self, color):
+        World.agent_store.rgb[self.slot] = color[:3]
+
+    @property
+    def heading(self):
+        return World.agent_store.heading.item(self.slot)
+
+    @heading.setter
+    def heading(self, heading):
+        World.agent_store.heading[self.slot] = heading
+
+    @property
+    def speed(self):
+        return World.agent_store.speed.item(self.slot)
+
+    @speed.setter
+    def speed(self, speed):
+        World.agent_store.speed[self.slot] = speed
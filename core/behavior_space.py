@@ -0,0 +1,155 @@
+"""
+A BehaviorSpace-like experiment runner.
+
+Run a World subclass headless over a grid of widget values, several times for each combination,
+and collect reporter values at selected ticks into a single results table.
+
+The runs are spread over a ProcessPoolExecutor. Its worker processes are reused from run to run,
+so the numpy and pygame imports, font setup, and the headless SimEngine are paid for once per worker
+rather than once per run.
+"""
+
+import csv
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+import pygame as pg
+
+import core.gui as gui
+from core.agent import Agent
+from core.sim_engine import SimEngine
+from core.world_patch_block import Patch
+
+
+# This process's headless SimEngine, by its engine_kwargs, with the widget values it starts with.
+# It holds at most one engine. See worker_engine().
+WORKER_ENGINES = {}
+
+
+def expand_grid(param_grid):
+    """
+    param_grid maps widget keys to a list of values to try. Return a list of dictionaries,
+    one for each combination. {'density': [50, 90], 'speed': [1, 2]} produces four dictionaries.
+    """
+    keys = list(param_grid.keys())
+    return [dict(zip(keys, combination)) for combination in product(*(param_grid[key] for key in keys))]
+
+
+def init_worker():
+    """ Run once in each worker process, before its first run. """
+    pg.font.init()
+
+
+def run_experiment(world_class, param_grid, repetitions=1, reporters=None, report_ticks=None, max_ticks=100,
+                   gui_left_upper=None, gui_right_upper=None, agent_class=Agent, patch_class=Patch,
+                   patch_size=11, board_rows_cols=(51, 51), clear=None, bounce=None,
+                   base_seed=0, max_workers=None, output_file=None):
+    """
+    Run world_class once for each combination in param_grid, repetitions times per combination.
+
+    reporters maps column names to functions of the world, e.g., {'unhappy': count_unhappy}.
+    They are sent to the worker processes, so they must be module-level functions, not lambdas.
+    They are evaluated at each tick in report_ticks (0 is the state right after setup)
+    and at the end of the run. If report_ticks is None, they are evaluated only at the end.
+
+    Widgets missing from param_grid take their default values from gui_left_upper and gui_right_upper.
+    Run number i is seeded with base_seed + i, so results are repeatable.
+
+    Returns a list of rows (dictionaries), one per run per reported tick. If output_file is given,
+    the rows are also written there as a csv file.
+    """
+    # Layouts hold PySimpleGUI elements, which don't pickle. Send the workers their default values instead.
+    defaults = {**gui.layout_defaults(gui_left_upper if gui_left_upper else [[]]),
+                **gui.layout_defaults(gui_right_upper if gui_right_upper else [[]])}
+    engine_kwargs = {'patch_size': patch_size, 'board_rows_cols': board_rows_cols, 'clear': clear, 'bounce': bounce}
+    run_specs = [(run_number, world_class, patch_class, agent_class, engine_kwargs, defaults, params,
+                  reporters if reporters else {}, report_ticks, max_ticks, base_seed + run_number)
+                 for (run_number, (params, _rep)) in enumerate(product(expand_grid(param_grid), range(repetitions)))]
+
+    if max_workers == 1:
+        rows_per_run = [run_one(run_spec) for run_spec in run_specs]
+    else:
+        max_workers = max_workers if max_workers else os.cpu_count()
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker) as executor:
+            chunksize = max(1, len(run_specs) // (4 * max_workers))
+            rows_per_run = list(executor.map(run_one, run_specs, chunksize=chunksize))
+
+    rows = [row for run_rows in rows_per_run for row in run_rows]
+    if output_file:
+        write_table(rows, output_file)
+    return rows
+
+
+def run_one(run_spec):
+    """ Execute a single run in the current process. Returns its rows. """
+    (run_number, world_class, patch_class, agent_class, engine_kwargs, defaults, params,
+     reporters, report_ticks, max_ticks, seed) = run_spec
+
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+
+    (sim_engine, standard_values) = worker_engine(engine_kwargs)
+    # As in SimEngine.__init__: the layout defaults, overridden by the standard widgets, overridden by params.
+    SimEngine.values = {**defaults, **standard_values, **params}
+    the_world = world_class(patch_class, agent_class)
+
+    rows = []
+
+    def report(world):
+        values = {name: reporter(world) for (name, reporter) in reporters.items()}
+        rows.append({'run': run_number, 'seed': seed, **params, 'tick': world.ticks, **values})
+
+    def report_if_selected(world):
+        if world.ticks in report_ticks:
+            report(world)
+
+    sim_engine.run_headless(the_world, max_ticks=max_ticks,
+                            after_step=None if report_ticks is None else report_if_selected)
+    # Always report the final state.
+    if not rows or rows[-1]['tick'] != the_world.ticks:
+        report(the_world)
+    return rows
+
+
+def worker_engine(engine_kwargs):
+    """
+    The headless SimEngine for engine_kwargs in this process. It is reused as long as the runs ask for
+    the same engine_kwargs. Creating an engine sets the core.gui sizes and screen for its board, so a
+    different board gets a new engine. Returns it with the values of its standard widgets, to which each
+    run adds its own values.
+    """
+    key = tuple(sorted(engine_kwargs.items()))
+    if key not in WORKER_ENGINES:
+        # Only the newest engine's board matches the core.gui globals.
+        WORKER_ENGINES.clear()
+        sim_engine = SimEngine([], headless=True, **engine_kwargs)
+        WORKER_ENGINES[key] = (sim_engine, SimEngine.values)
+    return WORKER_ENGINES[key]
+
+
+def write_table(rows, output_file):
+    """ Write the rows as a csv file. The columns are the union of the rows' keys, in order of appearance. """
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    with open(output_file, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def nbr_alive(world):
+    """ A reporter for the demo below. Reporters are sent to the workers, so they must be module-level. """
+    return sum(1 for patch in world.patches if patch.is_alive())
+
+
+if __name__ == "__main__":
+    # A small sweep of the Game of Life. Run from the PyLogo directory: python -m core.behavior_space
+    from Examples.game_of_life import Life_Patch, Life_World, gol_left_upper
+
+    results = run_experiment(Life_World, {'density': [10, 35, 60]}, repetitions=4,
+                             reporters={'alive': nbr_alive}, report_ticks={0, 25}, max_ticks=50,
+                             gui_left_upper=gol_left_upper, patch_class=Life_Patch, output_file='life_sweep.csv')
+    for row in results:
+        print(row)
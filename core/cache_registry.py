@@ -0,0 +1,103 @@
+"""
+A registry of the memoizing caches in core.
+
+Decorate a function with @cached(maxsize=...) rather than @lru_cache(maxsize=...) to register it under
+its full name, e.g., 'core.agent.rotated_sprite'. Then
+    report()                  returns a table of each cache's hits, misses, hit rate, size, and evictions,
+    reset_stats()             zeroes their counts but keeps their entries, e.g., between runs,
+    reset()                   empties all the caches and zeroes their counts,
+    configure({name: size})   resizes the named caches (PyLogo's cache_sizes argument calls it).
+"""
+
+from functools import lru_cache, update_wrapper
+
+# The registered caches, by name.
+CACHES = {}
+
+
+class CachedFunction:
+    """
+    A function wrapped in an lru_cache that can be resized. Resizing wraps the function in a new lru_cache,
+    which callers see because they hold this object rather than the lru_cache itself.
+    """
+
+    def __init__(self, fn, maxsize):
+        update_wrapper(self, fn)
+        self.cached_fn = lru_cache(maxsize=maxsize)(fn)
+        # The cache_info hits, misses, and currsize when the statistics were last reset. See reset_stats.
+        self.baseline = (0, 0, 0)
+
+    def __call__(self, *args, **kwargs):
+        return self.cached_fn(*args, **kwargs)
+
+    def cache_clear(self):
+        self.cached_fn.cache_clear()
+        self.baseline = (0, 0, 0)
+
+    def cache_info(self):
+        return self.cached_fn.cache_info()
+
+    def resize(self, maxsize):
+        """ Replace the cache with an empty one of size maxsize. """
+        self.cached_fn = lru_cache(maxsize=maxsize)(self.__wrapped__)
+        self.baseline = (0, 0, 0)
+
+    def reset_stats(self):
+        """ Count hits, misses, and evictions from now on. The cached entries stay. """
+        info = self.cache_info()
+        self.baseline = (info.hits, info.misses, info.currsize)
+
+    def stats(self):
+        """ The statistics since the last reset_stats. size and maxsize are the cache's current ones. """
+        info = self.cache_info()
+        (base_hits, base_misses, base_size) = self.baseline
+        (hits, misses) = (info.hits - base_hits, info.misses - base_misses)
+        calls = hits + misses
+        # Every miss adds an entry. Those that didn't add to the size were balanced by evictions.
+        return {'hits': hits, 'misses': misses, 'hit_rate': hits / calls if calls else 0.0,
+                'size': info.currsize, 'maxsize': info.maxsize, 'evictions': misses - (info.currsize - base_size)}
+
+
+def cached(maxsize=128):
+    """ Like functools.lru_cache(maxsize), but the cache is registered. """
+    def register(fn):
+        cached_fn = CachedFunction(fn, maxsize)
+        CACHES[f'{fn.__module__}.{fn.__qualname__}'] = cached_fn
+        return cached_fn
+    return register
+
+
+def configure(sizes):
+    """ sizes maps cache names to their new maxsize. The resized caches start out empty. """
+    unknown = set(sizes) - set(CACHES)
+    if unknown:
+        raise Exception(f'Unknown caches: {sorted(unknown)}. The caches are {sorted(CACHES)}.')
+    for (name, maxsize) in sizes.items():
+        CACHES[name].resize(maxsize)
+
+
+def report():
+    """ A table of the statistics of all the caches. """
+    lines = [f'{"cache":<42} {"hits":>9} {"misses":>8} {"hit rate":>8} {"size":>11} {"evictions":>9}']
+    for (name, cached_fn) in sorted(CACHES.items()):
+        stats = cached_fn.stats()
+        lines.append(f'{name:<42} {stats["hits"]:9} {stats["misses"]:8} {stats["hit_rate"]:8.1%} '
+                     f'{stats["size"]:5}/{stats["maxsize"]:<5} {stats["evictions"]:9}')
+    return '\n'.join(lines)
+
+
+def reset():
+    """ Empty all the caches, which also zeroes their statistics. """
+    for cached_fn in CACHES.values():
+        cached_fn.cache_clear()
+
+
+def reset_stats():
+    """ Zero the statistics of all the caches but keep their entries. """
+    for cached_fn in CACHES.values():
+        cached_fn.reset_stats()
+
+
+def stats():
+    """ {cache name: its statistics (see CachedFunction.stats)} """
+    return {name: cached_fn.stats() for (name, cached_fn) in CACHES.items()}
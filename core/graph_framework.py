@@ -12,7 +12,7 @@ from core.gui import (BLOCK_SPACING, CIRCLE, HOR_SEP, KNOWN_FIGURES, NETLOGO_FIG
                       SCREEN_PIXEL_WIDTH, STAR)
 from core.link import Link, link_exists
 from core.pairs import Pixel_xy, Velocity
-from core.sim_engine import gui_get, gui_set
+from core.sim_engine import gui_get, gui_params, gui_set
 from core.utils import normalize_dxdy
 from core.world_patch_block import World
 
@@ -81,10 +81,6 @@ class Graph_Node(Agent):
                   )
         return normalized_force
 
-    def delete(self):
-        World.agents.remove(self)
-        World.links -= {lnk for lnk in World.links if lnk.includes(self)}
-
     def draw(self, shape_name=None):
         super().draw(shape_name=shape_name)
         if self.selected:
@@ -96,22 +92,23 @@ class Graph_Node(Agent):
         """
         Compute the force between pixel_a pixel and pixel_b and return it as a velocity: direction * force.
         """
+        params = gui_params()
         direction: Velocity = normalize_dxdy( (pixel_a - pixel_b) if repulsive else (pixel_b - pixel_a) )
         d = max(1, pixel_a.distance_to(pixel_b))  #, wrap=False))
         if repulsive:
             dist = max(1, pixel_a.distance_to(pixel_b) / screen_distance_unit)  #, wrap=False)
-            rep_coefficient = gui_get(REP_COEFF)
-            rep_exponent = gui_get(REP_EXPONENT)
+            rep_coefficient = params[REP_COEFF]
+            rep_exponent = params[REP_EXPONENT]
             force = direction * ((10**rep_coefficient)/10) * dist**rep_exponent
             return force
         else:  # attraction
             dist = max(1, max(d, screen_distance_unit) / screen_distance_unit)
-            att_exponent = gui_get(ATT_EXPONENT)
+            att_exponent = params[ATT_EXPONENT]
             force = direction*dist**att_exponent
             # If the link is too short, push away instead of attracting.
             if d < screen_distance_unit:
                 force = force*(-1)
-            att_coefficient = gui_get(ATT_COEFF)
+            att_coefficient = params[ATT_COEFF]
             final_force = force * 10**(att_coefficient-1)
             return final_force
 
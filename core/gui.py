@@ -12,6 +12,7 @@ from pygame.surface import Surface
 # By importing this file itself, can avoid the use of globals
 # noinspection PyUnresolvedReferences
 import core.gui as gui
+from core.cache_registry import cached
 
 # Assumes that all Blocks are square with side BLOCK_SIDE and one pixel between them.
 # PATCH_SIZE should be odd so that there is a center pixel: (HALF_PATCH_SIZE(), HALF_PATCH_SIZE()).
@@ -120,37 +121,110 @@ FONT: SysFont
 
 
 # These pygame functions draw to the SCREEN, which is a pygame Surface.
-def blit(image: Surface, rect: Union[Rect, Tuple]):
-    gui.SCREEN.blit(image, rect)
+def blit(image: Surface, rect: Union[Rect, Tuple]) -> Rect:
+    return gui.SCREEN.blit(image, rect)
+
+
+def blit_array(pixels) -> Rect:
+    """ Copy pixels, a numpy array of shape (screen width, screen height, 3), to the whole screen. """
+    pg.surfarray.blit_array(gui.SCREEN, pixels)
+    return gui.SCREEN.get_rect()
+
+
+def circle_radius(agent, shape_name):
+    """ The radius of agent when it is drawn as a circle or node. """
+    return int(round(BLOCK_SPACING()/2)*agent.scale if shape_name == CIRCLE else 3)
 
 
 def draw(agent, shape_name):
-    if shape_name in ['circle', 'node']:
-        radius = round(BLOCK_SPACING()/2)*agent.scale if shape_name == 'circle' else 3
+    if shape_name in [CIRCLE, NODE]:
+        radius = circle_radius(agent, shape_name)
         # pg.draw.circle(gui.SCREEN, agent.color, agent.rect.center, int(radius), 0)
-        pg.draw.circle(gui.SCREEN, agent.color, agent.center_pixel.as_int(), int(radius), 0)
+        return pg.draw.circle(gui.SCREEN, agent.color, agent.center_pixel.as_int(), radius, 0)
     else:
         print(f"Don't know how to draw a {shape_name}.")
+        return None
+
+
+def draw_circles(centers, radius, color):
+    """
+    Draw filled circles of the same radius and color centered at centers, a list of integer (x, y) pairs.
+    pygame has no call that draws many circles, so this still makes one pg.draw.circle call per circle.
+    What it saves is the per-agent dispatch through Agent.draw, Block.draw, and gui.draw.
+    """
+    circle = pg.draw.circle
+    for center in centers:
+        circle(gui.SCREEN, color, center, radius, 0)
 
 
 def draw_label(label, text_center, obj_center, line_color):
-    text = gui.FONT.render(label, True, Color('black'), Color('white'))
+    text = rendered_text(label, (0, 0, 0), (255, 255, 255), gui.FONT)
     # offset = Block.patch_text_offset if isinstance(self, Patch) else Block.agent_text_offset
     # text_center = Pixel_xy((self.rect.x + offset, self.rect.y + offset))
-    gui.blit(text, text_center)
+    text_rect = gui.blit(text, text_center)
     # line_color = Color('white') if isinstance(self, Patch) and self.color == Color('black') else self.color
     if line_color is not None:
-        gui.draw_line(start_pixel=obj_center, end_pixel=text_center, line_color=line_color)
+        line_rect = gui.draw_line(start_pixel=obj_center, end_pixel=text_center, line_color=line_color)
+        text_rect = text_rect.union(line_rect)
+    return text_rect
 
 
 def draw_line(start_pixel, end_pixel, line_color: Color = Color('white'), width=1):
-    line(gui.SCREEN, line_color, start_pixel, end_pixel, width)
+    return line(gui.SCREEN, line_color, start_pixel, end_pixel, width)
+
+
+def draw_segments(segments, color, width=1):
+    """
+    Draw line segments of the same color and width. segments is a list of (start_pixel, end_pixel) pairs
+    of (x, y) tuples. pygame has no call that draws many separate segments, but this loop makes only
+    the pg.draw.line calls themselves.
+    """
+    for (start, end) in segments:
+        line(gui.SCREEN, color, start, end, width)
+
+
+def fill_rect(color: Color, rect: Rect) -> Rect:
+    return gui.SCREEN.fill(color, rect)
+
+
+def layout_defaults(layout):
+    """
+    Walk a PySimpleGUI layout (a list of rows of elements, with Columns nested inside it) and return
+    a dictionary that maps the key of each input widget to its default value. This is the dictionary
+    WINDOW.read() would return before the user touched anything. Buttons and Text are skipped.
+    """
+    defaults = {}
+    for row in layout:
+        for element in row:
+            if isinstance(element, (sg.Column, sg.Frame, sg.Tab, sg.TabGroup)):
+                defaults.update(layout_defaults(element.Rows))
+            elif element.Key is None:
+                continue
+            elif isinstance(element, (sg.Checkbox, sg.Radio)):
+                defaults[element.Key] = element.InitialState
+            elif isinstance(element, sg.Slider):
+                defaults[element.Key] = element.Range[0] if element.DefaultValue is None else element.DefaultValue
+            elif isinstance(element, (sg.Combo, sg.Spin)):
+                defaults[element.Key] = element.DefaultValue
+            elif isinstance(element, sg.Input):
+                defaults[element.Key] = element.DefaultText
+    return defaults
+
+
+@cached(maxsize=1024)
+def rendered_text(text, fg_rgb, bg_rgb, font):
+    """
+    text rendered in font, colored fg_rgb on bg_rgb. Most labels are the same from one frame to the next,
+    so the Surfaces are cached. They are shared: don't draw on them. rendered_text.cache_info() reports
+    the hits and misses. font is part of the key because SimpleGUI replaces gui.FONT when it starts.
+    """
+    return font.render(text, True, fg_rgb, bg_rgb)
 
 
 class SimpleGUI:
 
     def __init__(self, gui_left_upper, gui_right_upper=None, caption="Basic Model",
-                 patch_size=15, board_rows_cols=(51, 51), clear=None, bounce=None, fps=None):
+                 patch_size=15, board_rows_cols=(51, 51), clear=None, bounce=None, fps=None, headless=False):
 
         gui.PATCH_SIZE = patch_size if patch_size % 2 == 1 else patch_size + 1
         gui.PATCH_ROWS = board_rows_cols[0] if board_rows_cols[0] % 2 == 1 else board_rows_cols[0] + 1
@@ -167,14 +241,21 @@ class SimpleGUI:
 
         self.screen_shape_width_height = (SCREEN_PIXEL_WIDTH(), SCREEN_PIXEL_HEIGHT())
 
-        # All these gui.<variable> elements are globals in this file.
-        gui.WINDOW = self.make_window(caption, gui_left_upper, gui_right_upper=gui_right_upper,
-                                      clear=clear, bounce=bounce, fps=fps)
-        pg.init()
-        gui.FONT = SysFont(None, int(1.5 * gui.BLOCK_SPACING()))
-
-        # All graphics are drawn to gui.SCREEN, which is a global variable.
-        gui.SCREEN = pg.display.set_mode(self.screen_shape_width_height)
+        if headless:
+            # No PySimpleGUI window and no pygame display. gui.WINDOW is never created.
+            # gui.SCREEN is an off-screen Surface of the same size, which may or may not be drawn on.
+            pg.font.init()
+            gui.FONT = SysFont(None, int(1.5 * gui.BLOCK_SPACING()))
+            gui.SCREEN = Surface(self.screen_shape_width_height)
+        else:
+            # All these gui.<variable> elements are globals in this file.
+            gui.WINDOW = self.make_window(caption, gui_left_upper, gui_right_upper=gui_right_upper,
+                                          clear=clear, bounce=bounce, fps=fps)
+            pg.init()
+            gui.FONT = SysFont(None, int(1.5 * gui.BLOCK_SPACING()))
+
+            # All graphics are drawn to gui.SCREEN, which is a global variable.
+            gui.SCREEN = pg.display.set_mode(self.screen_shape_width_height)
 
     @staticmethod
     def fill_screen():
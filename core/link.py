@@ -17,12 +17,11 @@ def link_exists(agent_1, agent_2, directed=False):
     """
     Determine whether a directed/undirected link between agent_1 and agent_2 already exists in World.links.
 
-    The strategy is to create a hash_object of the possible link and then see if any existing link has
-    the same hash_object.
+    The strategy is to create a hash_object of the possible link and then look it up in World.links,
+    which indexes its links by hash_object.
     """
     hash_obj = hash_object(agent_1, agent_2, directed)
-    links = [lnk for lnk in World.links if lnk.hash_object == hash_obj]
-    return links[0] if links else None
+    return World.links.get(hash_obj)
 
 
 def is_reachable_via(agent_1, link_list, agent_2) -> bool:
@@ -104,6 +103,22 @@ class Link:
     def __repr__(self):
         return f'{self.agent_1} {"-->" if self.directed else "<-->"} {self.agent_2}'
 
+    @classmethod
+    def batchable(cls):
+        """ Whether World.draw_links may draw links of this class in batches, i.e., it draws them as Link.draw does. """
+        return cls.draw is Link.draw
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        self._color = color
+        # Let World.draw_links know that the links must be regrouped.
+        if World.links is not None:
+            World.links.version += 1
+
     def draw(self):
         # gui.draw_line(self.agent_1.rect.center, self.agent_2.rect.center, line_color=self.color, width=self.width)
         gui.draw_line(self.agent_1.center_pixel, self.agent_2.center_pixel, line_color=self.color, width=self.width)
@@ -118,6 +133,11 @@ class Link:
         line_color = self.color
         gui.draw_label(my_label, text_center, obj_center, line_color)
 
+    @classmethod
+    def has_label(cls):
+        """ Whether links of this class may have labels. """
+        return cls.label is not Link.label
+
     def includes(self, agent):
         return agent in (self.agent_1, self.agent_2)
 
@@ -147,3 +167,13 @@ class Link:
         """
         sibs = (self.agent_1.lnk_nbrs(), self.agent_2.lnk_nbrs())
         return sibs if len(sibs[0]) < len(sibs[1]) else (sibs[1], sibs[0])
+
+    @property
+    def width(self):
+        return self._width
+
+    @width.setter
+    def width(self, width):
+        self._width = width
+        if World.links is not None:
+            World.links.version += 1
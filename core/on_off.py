@@ -7,7 +7,7 @@ from pygame.color import Color
 import core.gui as gui
 from core.sim_engine import gui_get, SimEngine
 from core.utils import rgb_to_hex
-from core.world_patch_block import Patch, World
+from core.world_patch_block import Patch, PatchVariable, World
 
 
 class OnOffPatch(Patch):
@@ -16,6 +16,8 @@ class OnOffPatch(Patch):
     on_color = Color('white')
     off_color = Color('black')
 
+    is_on = PatchVariable(bool, False)
+
     def __init__(self, *args, **kw_args):
         super().__init__(*args, **kw_args)
         self.is_on = False
@@ -43,7 +45,9 @@ class OnOffWorld(World):
         color_string = gui_get(key)
         if color_string in {'None', '', None}:
             color_string = default_color_string
-        button.update(button_color=(color_string, color_string))
+        # A headless run has no window, so there is no button to recolor.
+        if not SimEngine.headless:
+            button.update(button_color=(color_string, color_string))
         color = Color(color_string)
         return color
 
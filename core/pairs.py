@@ -1,36 +1,44 @@
 
 from __future__ import annotations
 
-from functools import lru_cache
 from math import copysign, hypot
+from operator import itemgetter
 from random import randint
 
+import numpy as np
+
 import core.gui as gui
 import core.utils as utils
-from core.sim_engine import gui_get
+from core.sim_engine import gui_params
 
 
 class XY(tuple):
+    """
+    An (x, y) pair. It's a tuple, so it compares, hashes, and unpacks like one.
+    The arithmetic builds results with tuple.__new__ and reads coordinates by index rather than through
+    the x and y properties: these are the innermost operations of most models.
+    """
+
+    __slots__ = ()
 
     def __add__(self, xy: XY):
-        sum = (self.x + xy.x, self.y + xy.y)
-        return self.restore_type(sum)
+        return tuple.__new__(type(self), (self[0] + xy[0], self[1] + xy[1]))
 
     def __truediv__(self, scalar):
-        quot = (float('inf'), float('inf')) if scalar == 0 else self * (1/scalar)
-        return self.restore_type(quot)
+        if scalar == 0:
+            return tuple.__new__(type(self), (float('inf'), float('inf')))
+        inverse = 1/scalar
+        return tuple.__new__(type(self), (self[0] * inverse, self[1] * inverse))
 
     def __mul__(self, scalar):
-        prod = (self.x * scalar, self.y * scalar)
-        return self.restore_type(prod)
+        return tuple.__new__(type(self), (self[0] * scalar, self[1] * scalar))
 
     def __str__(self):
         clas_string = utils.extract_class_name(self.__class__)
         return f'{clas_string}{(self.x, self.y)}'
 
     def __sub__(self, xy: XY):
-        diff = (self.x - xy.x, self.y - xy.y)
-        return self.restore_type(diff)
+        return tuple.__new__(type(self), (self[0] - xy[0], self[1] - xy[1]))
 
     def as_int(self):
         int_tuple = (int(self.x), int(self.y))
@@ -44,31 +52,34 @@ class XY(tuple):
         new_y = copysign(min(magnitude_max, abs(self.y)), self.y)
         return self.restore_type((new_x, new_y))
 
-    def restore_type(self, tuple):
-        cls = type(self)
-        return cls(tuple)
+    def restore_type(self, tuple_xy):
+        return tuple.__new__(type(self), tuple_xy)
 
     def round(self, prec=0):
         return self.restore_type( (round(self.x, prec), round(self.y, prec)) )
 
     def wrap3(self, x_limit, y_limit):
-        wrapped_tuple = (self.x % x_limit, self.y % y_limit)
+        wrapped_tuple = (self[0] % x_limit, self[1] % y_limit)
         return self.restore_type(wrapped_tuple)
 
-    @property
-    def x(self):
-        return self[0]
-
-    @property
-    def y(self):
-        return self[1]
+    # itemgetter is implemented in C, so these are faster than properties defined with def.
+    x = property(itemgetter(0))
+    y = property(itemgetter(1))
 
 
 class Pixel_xy(XY):
 
+    __slots__ = ()
+
     # Will be set to Pixel_xy(0, 0) after the Pixel_xy class is defined.
     pixel_xy_00 = None
 
+    # The (width, height) around which distances wrap, or None if the world doesn't wrap. It depends on
+    # the screen size and the 'Bounce?' checkbox, so it is recomputed at setup and when a widget value
+    # changes, i.e., when gui_params() is a new ParamSnapshot. See torus_size().
+    torus = None
+    torus_params = None
+
     def __str__(self):
         return f'Pixel_xy{self.x, self.y}'
 
@@ -77,23 +88,20 @@ class Pixel_xy(XY):
         return closest
 
     def distance_to(self, other):
-        # Try all ways to get there possibly including wrapping around.
-        bounce = gui_get('Bounce?')
-        wrap = bounce is not None and not bounce
-
-        # Can't do this directly since importing World would be circular
-        end_pts = [(self, other)]
-        if wrap:
-            screen_width = gui.SCREEN_PIXEL_WIDTH()
-            screen_height = gui.SCREEN_PIXEL_HEIGHT()
-            wrapped_end_pts = [((self+a+b).wrap3(screen_width, screen_height),
-                                (other+a+b).wrap3(screen_width, screen_height))
-                               for a in [Pixel_xy.pixel_xy_00, Pixel_xy((screen_width/2, 0))]
-                               for b in [Pixel_xy.pixel_xy_00, Pixel_xy((0, screen_height/2))]
-                               ]
-            end_pts += wrapped_end_pts
-        dist = min(hypot(start.x - end.x, start.y - end.y) for (start, end) in end_pts)
-        return dist
+        """
+        If the world wraps, the distance on the torus: along each axis, the shorter of the direct
+        way and the way around the edge (the minimum-image convention).
+        """
+        delta_x = abs(self[0] - other[0])
+        delta_y = abs(self[1] - other[1])
+        torus = Pixel_xy.torus_size()
+        if torus:
+            (width, height) = torus
+            delta_x %= width
+            delta_y %= height
+            delta_x = min(delta_x, width - delta_x)
+            delta_y = min(delta_y, height - delta_y)
+        return hypot(delta_x, delta_y)
 
     def heading_toward(self, to_pixel: Pixel_xy):
         """ The heading to face from the from_pixel to the to_pixel """
@@ -119,6 +127,20 @@ class Pixel_xy(XY):
         y_random = randint(1, gui.SCREEN_PIXEL_HEIGHT()-1)
         return Pixel_xy((x_random, y_random))
 
+    @staticmethod
+    def set_topology(params=None):
+        """ Cache the torus for params, by default the current ParamSnapshot. """
+        Pixel_xy.torus_params = params if params is not None else gui_params()
+        Pixel_xy.torus = (gui.SCREEN_PIXEL_WIDTH(), gui.SCREEN_PIXEL_HEIGHT()) if world_wraps() else None
+
+    @staticmethod
+    def torus_size():
+        """ Pixel_xy.torus, recomputed if the widget values have changed. """
+        params = gui_params()
+        if params is not Pixel_xy.torus_params:
+            Pixel_xy.set_topology(params)
+        return Pixel_xy.torus
+
     def wrap(self):
         screen_rect = gui.SCREEN.get_rect()
         # Must wrap at screen_rect.w-1 and screen_rect.h-1 because the screen
@@ -132,6 +154,8 @@ Pixel_xy.pixel_xy_00 = Pixel_xy((0, 0))
 
 class RowCol(XY):
 
+    __slots__ = ()
+
     def __str__(self):
         return f'RowCol{self.row, self.col}'
 
@@ -159,21 +183,18 @@ class RowCol(XY):
 
 class Velocity(XY):
 
+    __slots__ = ()
+
     velocity_00 = None
 
     def __str__(self):
         return f'Velocity{self.dx, self.dy}'
 
-    # The @property decorator allows you to call the function without parentheses:
-    # v = Velocity(3, 4)
+    # The same properties as x and y, so you can access them without parentheses:
+    # v = Velocity((3, 4))
     # v.dx => 3
-    @property
-    def dx(self):
-        return self.x
-
-    @property
-    def dy(self):
-        return self.y
+    dx = XY.x
+    dy = XY.y
 
 
 Velocity.velocity_00 = Velocity((0, 0))
@@ -185,25 +206,91 @@ def center_pixel():
     return cp
 
 
+def pairwise_distances(pixels_a, pixels_b=None) -> np.ndarray:
+    """
+    The distances, as in Pixel_xy.distance_to, between each of pixels_a and each of pixels_b
+    (by default pixels_a again). Either may be a sequence of Pixel_xy or an (n, 2) array.
+    Returns an array of shape (len(pixels_a), len(pixels_b)).
+    """
+    points_a = np.asarray(pixels_a, dtype=float).reshape(-1, 2)
+    points_b = points_a if pixels_b is None else np.asarray(pixels_b, dtype=float).reshape(-1, 2)
+    deltas = np.abs(points_a[:, np.newaxis, :] - points_b[np.newaxis, :, :])
+    torus = Pixel_xy.torus_size()
+    if torus:
+        sizes = np.array(torus, dtype=float)
+        deltas %= sizes
+        np.minimum(deltas, sizes - deltas, out=deltas)
+    return np.hypot(deltas[..., 0], deltas[..., 1])
+
+
+def world_wraps() -> bool:
+    """ Distances wrap around the screen edges unless there is a 'Bounce?' checkbox and it is checked. """
+    bounce = gui_params().bounce
+    return bounce is not None and not bounce
+
+
 def heading_and_speed_to_velocity(heading, speed) -> Velocity:
     unit_dxdy = heading_to_unit_dxdy(heading)
     velocity = unit_dxdy * speed
     return velocity
 
 
-@lru_cache(maxsize=512)
 def heading_to_unit_dxdy(heading) -> Velocity:
     """ Convert a heading to a (dx, dy) pair as a unit velocity """
-    angle = utils.heading_to_angle(heading)
-    dx = utils.cos(angle)
-    # The -1 accounts for the y-axis being inverted.
-    dy = (-1) * utils.sin(angle)
-    vel = Velocity((dx, dy))
-    return vel
+    return UNIT_DXDY[utils.normalize_360(heading)]
+
+
+# The unit velocity for each heading in range(360), from the tables in core.utils. Shared: don't modify them.
+UNIT_DXDY = [Velocity((utils.DX_TABLE[heading], utils.DY_TABLE[heading])) for heading in range(360)]
+
+
+def benchmark(nbr_ops=1_000_000):
+    """
+    Time the vector operations of a typical agent update against tuple-subclass pairs that rebuild
+    their results through type(self)(tuple) and read coordinates through def-properties.
+    """
+    from timeit import timeit
+
+    class ReferenceXY(tuple):
+
+        def __add__(self, xy):
+            return self.restore_type((self.x + xy.x, self.y + xy.y))
+
+        def __mul__(self, scalar):
+            return self.restore_type((self.x * scalar, self.y * scalar))
+
+        def __sub__(self, xy):
+            return self.restore_type((self.x - xy.x, self.y - xy.y))
+
+        def restore_type(self, tuple_xy):
+            return type(self)(tuple_xy)
+
+        @property
+        def x(self):
+            return self[0]
+
+        @property
+        def y(self):
+            return self[1]
+
+    class ReferencePixel_xy(ReferenceXY):
+        pass
+
+    def update(pixel, velocity, other):
+        return (pixel + velocity*1.5 - other).x
+
+    nbr_runs = nbr_ops // 4
+    print(f'{nbr_runs:,} updates, pixel + velocity*1.5 - other, then .x:')
+    for (label, cls) in [('reference', ReferencePixel_xy), ('XY', Pixel_xy)]:
+        (pixel, velocity, other) = (cls((10.0, 20.0)), cls((0.5, -0.25)), cls((3.0, 4.0)))
+        seconds = timeit(lambda: update(pixel, velocity, other), number=nbr_runs)
+        print(f'{label:>10}: {seconds:.3f} sec')
 
 
 if __name__ == "__main__":
 
+    benchmark()
+
     # Various tests and experiments
     print('\n-----XY-----')
     tuple_3_4 = (3, 4)
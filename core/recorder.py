@@ -0,0 +1,113 @@
+"""
+Record frames of a run to disk for later assembly into a video.
+
+Every `every` ticks, FrameRecorder draws the world into its own off-screen Surface and copies out the
+pixels. A background thread does the encoding and the disk writes, so the step loop only pays for the
+drawing and one copy, unless the writer falls max_pending frames behind, when record() waits for it.
+Frames are written either as numbered PNG files or appended to a single raw RGB
+file, which load_raw_frames() opens as a memory-mapped array. The raw file can also be fed straight to,
+for example, ffmpeg -f rawvideo -pix_fmt rgb24 -s <width>x<height> -i frames.rgb.
+
+Each Setup starts a new run, numbered from 0. PNG files are named frame_<run>_<tick>.png, so a second
+Setup doesn't overwrite the first run's frames. frames.json lists the run and tick of each RAW frame.
+"""
+
+import json
+import os
+from queue import Queue
+from threading import Thread
+
+import numpy as np
+import pygame as pg
+from pygame.surface import Surface
+
+import core.gui as gui
+from core.world_patch_block import World
+
+PNG = 'png'
+RAW = 'raw'
+
+
+class FrameRecorder:
+
+    def __init__(self, directory, every=1, frame_format=PNG, max_pending=64):
+        if frame_format not in (PNG, RAW):
+            raise Exception(f"Unknown frame format: {frame_format}. Use '{PNG}' or '{RAW}'.")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.every = every
+        self.frame_format = frame_format
+
+        self.size = gui.SCREEN.get_size()
+        self.surface = Surface(self.size)
+        self.run = 0
+        self.runs_recorded = []
+        self.ticks_recorded = []
+
+        self.raw_file = open(os.path.join(directory, 'frames.rgb'), 'wb') if frame_format == RAW else None
+        # Bounded, so that a slow disk holds up the run rather than filling memory with frames.
+        self.queue = Queue(maxsize=max_pending)
+        self.writer = Thread(target=self.write_frames, daemon=True)
+        self.writer.start()
+
+    def close(self):
+        """ Write the remaining frames and stop the writer thread. """
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        if self.raw_file:
+            self.raw_file.close()
+            (width, height) = self.size
+            with open(os.path.join(self.directory, 'frames.json'), 'w') as metadata_file:
+                json.dump({'width': width, 'height': height, 'runs': self.runs_recorded, 'ticks': self.ticks_recorded},
+                          metadata_file)
+
+    def draw_offscreen(self, world):
+        """ Draw world into self.surface rather than the display. """
+        screen = gui.SCREEN
+        gui.SCREEN = self.surface
+        try:
+            self.surface.fill(pg.Color(gui.SCREEN_COLOR))
+            world.draw()
+        finally:
+            gui.SCREEN = screen
+        # world.draw() recorded what it drew here, not what is on the display. Start the display over.
+        World.full_redraw = True
+
+    def flush(self):
+        """ Wait until all the frames recorded so far are on disk. """
+        self.queue.join()
+
+    def record(self, world):
+        """ Capture a frame if this is one of the ticks to record. Can be passed to run_headless as after_step. """
+        if world.ticks % self.every:
+            return
+        # The ticks start over after a Setup.
+        if self.ticks_recorded and world.ticks <= self.ticks_recorded[-1]:
+            self.run += 1
+        self.draw_offscreen(world)
+        self.runs_recorded.append(self.run)
+        self.ticks_recorded.append(world.ticks)
+        self.queue.put((self.run, world.ticks, pg.image.tostring(self.surface, 'RGB')))
+
+    def write_frames(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            (run, tick, rgb_bytes) = item
+            if self.frame_format == RAW:
+                self.raw_file.write(rgb_bytes)
+            else:
+                frame = pg.image.frombuffer(rgb_bytes, self.size, 'RGB')
+                pg.image.save(frame, os.path.join(self.directory, f'frame_{run:03d}_{tick:06d}.png'))
+            self.queue.task_done()
+
+
+def load_raw_frames(directory):
+    """ The frames of a RAW recording as a read-only memory-mapped array of shape (frames, height, width, 3). """
+    with open(os.path.join(directory, 'frames.json')) as metadata_file:
+        metadata = json.load(metadata_file)
+    shape = (len(metadata['ticks']), metadata['height'], metadata['width'], 3)
+    return np.memmap(os.path.join(directory, 'frames.rgb'), dtype=np.uint8, mode='r', shape=shape)
@@ -1,5 +1,6 @@
 
-from time import sleep
+import re
+from time import perf_counter, sleep
 
 import pygame as pg
 from pygame.time import Clock
@@ -8,20 +9,71 @@ import core.gui as gui
 from core.gui import FPS, GOSTOP, GO_ONCE, SimpleGUI
 
 
+def coerce_gui_value(value):
+    """ Sliders return floats. Return those that are whole numbers as ints. """
+    return int(value) if value != float('inf') and isinstance(value, float) and value == int(value) else value
+
+
+class ParamSnapshot:
+    """
+    A read-only copy of the widget values, with gui_get's coercion already applied.
+    Look values up either by widget key, params['Bounce?'], or as attributes, params.bounce.
+    The attribute name is the key in lower case with each run of other characters replaced by '_'.
+    So 'max-align-turn' becomes params.max_align_turn. Missing keys are None, as with gui_get.
+    """
+
+    def __init__(self, values):
+        object.__setattr__(self, 'raw_values', dict(values))
+        coerced = {key: coerce_gui_value(value) for (key, value) in values.items()}
+        coerced['enabled'] = not values.get('disabled', None)
+        object.__setattr__(self, 'coerced_values', coerced)
+        for (key, value) in coerced.items():
+            attr_name = re.sub('[^a-z0-9]+', '_', str(key).lower()).strip('_')
+            if attr_name.isidentifier() and attr_name not in self.__dict__:
+                object.__setattr__(self, attr_name, value)
+
+    def __getattr__(self, _name):
+        # Called only when there is no such attribute, i.e., when there is no such widget.
+        return None
+
+    def __getitem__(self, key):
+        return self.coerced_values.get(key, None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"ParamSnapshot is read-only. Use gui_set to change '{name}'.")
+
+
 class SimEngine:
 
     auto_setup = None
 
     event = None
     fps = 60
+    # By default, model_loop takes one step per frame and runs at fps frames per second. If steps_per_frame
+    # is more than 1, it draws one frame per steps_per_frame steps, still at most fps frames per second.
+    # If frame_budget (in seconds) is given, the steps are decoupled from the frames: model_loop runs as
+    # many steps as fit in frame_budget per pass with no delay, and redraws the screen only fps times
+    # per second.
+    frame_budget = None
+    headless = False
+    # SimEngine.params is a ParamSnapshot of SimEngine.values. params_source is the values dictionary
+    # it was last checked against. Every WINDOW.read() produces a new dictionary.
+    params = None
+    params_source = None
+    # An optional core.tick_profiler.TickProfiler.
+    profiler = None
+    # An optional core.recorder.FrameRecorder. It is given the world after each step.
+    recorder = None
     values = None
 
     simple_gui = None
+    steps_per_frame = 1
     world = None
     
 
     def __init__(self, gui_left_upper, caption="Basic Model", gui_right_upper=None,
-                 patch_size=11, board_rows_cols=(51, 51), clear=None, bounce=None, fps=None):
+                 patch_size=11, board_rows_cols=(51, 51), clear=None, bounce=None, fps=None,
+                 headless=False, params=None, steps_per_frame=1, frame_budget=None):
 
         # Constants for the main loop in start() below.
         self.CTRL_D = 'D:68'
@@ -34,18 +86,40 @@ class SimEngine:
         self.clock = Clock()
         SimEngine.fps = fps if fps else 60
         self.idle_fps = 10
+        SimEngine.steps_per_frame = steps_per_frame
+        SimEngine.frame_budget = frame_budget
 
+        SimEngine.headless = headless
         SimEngine.simple_gui = SimpleGUI(gui_left_upper, caption=caption, gui_right_upper=gui_right_upper,
                                          patch_size=patch_size, board_rows_cols=board_rows_cols,
-                                         clear=clear, bounce=bounce, fps=fps)
+                                         clear=clear, bounce=bounce, fps=fps, headless=headless)
         self.graph_point = None
 
+        if headless:
+            # With no window to read, a dictionary stands in for the widget values. Start with the
+            # defaults from the layout and the standard widgets, and let params override them.
+            standard_values = {'Clear?': clear, 'Bounce?': bounce, FPS: SimEngine.fps, 'Grab': False}
+            SimEngine.values = {**gui.layout_defaults(gui_left_upper),
+                                **gui.layout_defaults(gui_right_upper if gui_right_upper else [[]]),
+                                **{key: value for (key, value) in standard_values.items() if value is not None},
+                                **(params if params else {})}
+
     @staticmethod
     def draw_world():
-        """ Fill the screen with the background color, draw the world, and update the display. """
+        """
+        Fill the screen with the background color, draw the world, and update the display.
+        If the world draws incrementally, redraw and update only the parts of the screen that changed.
+        """
+        world = SimEngine.world
+        if world.incremental_draw and not world.needs_full_redraw():
+            changed_rects = world.draw_dirty()
+            if not SimEngine.headless and changed_rects:
+                pg.display.update(changed_rects)
+            return
         SimEngine.simple_gui.fill_screen()
-        SimEngine.world.draw()
-        pg.display.update()
+        world.draw()
+        if not SimEngine.headless:
+            pg.display.update()
 
     @staticmethod
     def gui_get(key):
@@ -53,10 +127,7 @@ class SimEngine:
         Widgets typically have a 'disabled' property. The following makes
         it possible to use 'enabled' as the negation of 'disabled'.
         """
-        if not SimEngine.values:
-            (SimEngine.event, SimEngine.values) = gui.WINDOW.read(timeout=10)
-        value = SimEngine.values.get(key, None) if key != 'enabled' else not SimEngine.values.get('disabled', None)
-        return int(value) if value != float('inf') and isinstance(value, float) and value == int(value) else value
+        return gui_get(key)
 
     @staticmethod
     def gui_set(key, **kwargs):
@@ -64,18 +135,21 @@ class SimEngine:
         Widgets typically have a 'disabled' property. The following makes
         it possible to use 'enabled' as the negation of 'disabled'.
         """
-        if 'enabled' in kwargs:
-            value = kwargs.get('enabled')
-            kwargs['disabled'] = not bool(value)
-            kwargs.pop('enabled')
-        widget = gui.WINDOW[key]
-        widget.update(**kwargs)
+        gui_set(key, **kwargs)
+
+    @staticmethod
+    def decoupled():
+        """ Whether steps are decoupled from frames. See SimEngine.frame_budget. """
+        return SimEngine.steps_per_frame != 1 or SimEngine.frame_budget is not None
 
     def model_loop(self):
+        # When steps are decoupled from frames, don't wait for events. The frame rate is controlled below.
+        read_timeout = 0 if self.decoupled() else 10
+        next_frame_time = perf_counter()
 
         # Run this loop until the model signals it is finished or until the user stops it by pressing the Stop button.
         while True:
-            (SimEngine.event, SimEngine.values) = gui.WINDOW.read(timeout=10)
+            (SimEngine.event, SimEngine.values) = SimEngine.timed('read', gui.WINDOW.read, timeout=read_timeout)
 
             if SimEngine.event in (None, SimEngine.simple_gui.EXIT):
                 return SimEngine.simple_gui.EXIT
@@ -97,22 +171,90 @@ class SimEngine:
                 SimEngine.gui_set(GO_ONCE, enabled=True)
                 break
 
+            elif SimEngine.event == '__TIMEOUT__' and self.decoupled():
+                self.run_steps()
+                if SimEngine.frame_budget is None:
+                    # One frame for the steps_per_frame steps just taken.
+                    SimEngine.timed('clock', self.clock.tick, SimEngine.fps)
+                # Redraw only when the next frame is due, or the world has just finished.
+                elif perf_counter() < next_frame_time and not SimEngine.world.done:
+                    continue
+                else:
+                    next_frame_time = perf_counter() + 1/SimEngine.fps
+
             elif SimEngine.event == '__TIMEOUT__':
-                # This increments the World's tick counter for the number of times we have gone around this loop.
-                # Examples.starburst uses it to decide when to "explode." Look at its step method.
-                SimEngine.world.increment_ticks()
-                # Take a step in the simulation.
-                SimEngine.world.step()
+                # This increments the World's tick counter for the number of times we have gone around this loop
+                # and takes a step in the simulation.
+                # Examples.starburst uses the tick counter to decide when to "explode." Look at its step method.
+                SimEngine.take_step()
                 # This line limits how fast the simulation runs. It is not a counter.
-                self.clock.tick(SimEngine.fps)
+                SimEngine.timed('clock', self.clock.tick, SimEngine.fps)
 
             else:
-                SimEngine.world.handle_event(SimEngine.event)
+                SimEngine.timed('event', SimEngine.world.handle_event, SimEngine.event)
 
-            SimEngine.draw_world()
+            SimEngine.timed('draw', SimEngine.draw_world)
 
         return self.NORMAL
 
+    @staticmethod
+    def record_frame():
+        if SimEngine.recorder:
+            SimEngine.recorder.record(SimEngine.world)
+
+    @staticmethod
+    def snapshot_params():
+        """
+        Freeze SimEngine.values into SimEngine.params. The window is read once per tick, so this runs
+        at most once per tick. A new snapshot is built only if a widget value has actually changed.
+        """
+        values = SimEngine.values
+        if SimEngine.params is None or SimEngine.params.raw_values != values:
+            SimEngine.params = ParamSnapshot(values)
+        SimEngine.params_source = values
+        return SimEngine.params
+
+    @staticmethod
+    def run_steps():
+        """
+        Run the steps for one frame: steps_per_frame steps or, if frame_budget is given, as many steps
+        as fit in frame_budget seconds. Stop early if the world is done.
+        """
+        world = SimEngine.world
+        end_time = None if SimEngine.frame_budget is None else perf_counter() + SimEngine.frame_budget
+        steps = 0
+        while not world.done:
+            SimEngine.take_step()
+            steps += 1
+            if steps >= SimEngine.steps_per_frame if end_time is None else perf_counter() >= end_time:
+                break
+
+    def run_headless(self, the_world, max_ticks=None, render=False, after_step=None):
+        """
+        Run the_world with no window: setup() and then step() in a tight loop until the world is done
+        or, if max_ticks is given, until World.ticks reaches max_ticks. If render, the world is also
+        drawn to the off-screen gui.SCREEN after each step. If after_step is given, it is called with
+        the world after setup() and after each step(). Returns the world so its state can be inspected.
+        """
+        SimEngine.world = the_world
+        the_world.reset_all()
+        the_world.setup()
+        SimEngine.record_frame()
+        if after_step:
+            after_step(the_world)
+        while not the_world.done and (max_ticks is None or the_world.ticks < max_ticks):
+            SimEngine.take_step()
+            if render:
+                SimEngine.timed('draw', SimEngine.draw_world)
+            if after_step:
+                after_step(the_world)
+        if SimEngine.profiler:
+            SimEngine.profiler.end_tick()
+        the_world.final_thoughts()
+        if SimEngine.recorder:
+            SimEngine.recorder.close()
+        return the_world
+
     @staticmethod
     def set_grab_anywhere(allow_grab_anywhere):
         if allow_grab_anywhere:
@@ -120,6 +262,25 @@ class SimEngine:
         else:
             gui.WINDOW.grab_any_where_off()
 
+    @staticmethod
+    def take_step():
+        """ Increment the tick counter, step the world, and record a frame if there is a recorder. """
+        if SimEngine.profiler:
+            SimEngine.profiler.start_tick()
+        SimEngine.world.increment_ticks()
+        SimEngine.timed('step', SimEngine.world.step)
+        SimEngine.timed('record', SimEngine.record_frame)
+
+    @staticmethod
+    def timed(phase, fn, *args, **kwargs):
+        """ Call fn. If the profiler is on, add the time it took to phase. See core.tick_profiler. """
+        if not SimEngine.profiler:
+            return fn(*args, **kwargs)
+        start = perf_counter()
+        result = fn(*args, **kwargs)
+        SimEngine.profiler.add(phase, perf_counter() - start)
+        return result
+
     def top_loop(self, the_world, auto_setup=False):
         SimEngine.world = the_world
         SimEngine.draw_world()
@@ -152,6 +313,7 @@ class SimEngine:
                 gui_set(GO_ONCE, enabled=False)
                 SimEngine.world.reset_all()
                 returned_value = SimEngine.world.setup()
+                SimEngine.record_frame()
                 gui_set(SimEngine.simple_gui.SETUP, enabled=True)
                 gui_set(GOSTOP, text='go', button_color=('white', 'green'), enabled=True)
                 gui_set(GO_ONCE, enabled=True)
@@ -164,8 +326,7 @@ class SimEngine:
                 SimEngine.gui_set(GOSTOP, text='stop', button_color=('white', 'red'), enabled=False)
                 SimEngine.gui_set(GO_ONCE, enabled=False)
                 SimEngine.gui_set(SimEngine.simple_gui.SETUP, enabled=False)
-                SimEngine.world.increment_ticks()
-                SimEngine.world.step()
+                SimEngine.take_step()
                 SimEngine.gui_set(SimEngine.simple_gui.SETUP, enabled=True)
                 SimEngine.gui_set(GOSTOP, text='go', button_color=('white', 'green'), enabled=True)
                 SimEngine.gui_set(GO_ONCE, enabled=True)
@@ -175,9 +336,13 @@ class SimEngine:
                 SimEngine.gui_set(GO_ONCE, enabled=False)
                 SimEngine.gui_set(SimEngine.simple_gui.SETUP, enabled=False)
                 returned_value = self.model_loop()
+                if SimEngine.recorder:
+                    SimEngine.recorder.flush()
                 SimEngine.gui_set(GOSTOP, text='go', button_color=('white', 'green'), enabled=True)
                 SimEngine.gui_set(GO_ONCE, enabled=True)
                 SimEngine.gui_set(SimEngine.simple_gui.SETUP, enabled=True)
+                if SimEngine.profiler:
+                    SimEngine.profiler.end_tick()
                 SimEngine.world.final_thoughts()
                 if returned_value == SimEngine.simple_gui.EXIT:
                     gui.WINDOW.close()
@@ -190,6 +355,9 @@ class SimEngine:
 
             self.clock.tick(self.idle_fps)
 
+        if SimEngine.recorder:
+            SimEngine.recorder.close()
+
 
 def draw_links(links, world_links_set):
     gui_set(gui.GOSTOP, text='pause', button_color=('white', 'red'), enabled=True)
@@ -222,10 +390,17 @@ def gui_get(key):
     Widgets typically have a 'disabled' property. The following makes
     it possible to use 'enabled' as the negation of 'disabled'.
     """
+    return gui_params()[key]
+
+
+def gui_params() -> ParamSnapshot:
+    """
+    The current ParamSnapshot. Hot loops should get it once and then use its attributes
+    rather than calling gui_get for each agent.
+    """
     if SimEngine.values is None:
         (SimEngine.event, SimEngine.values) = gui.WINDOW.read(timeout=10)
-    value = SimEngine.values.get(key, None) if key != 'enabled' else not SimEngine.values.get('disabled', None)
-    return int(value) if value != float('inf') and isinstance(value, float) and value == int(value) else value
+    return SimEngine.params if SimEngine.values is SimEngine.params_source else SimEngine.snapshot_params()
 
 
 def gui_set(key, **kwargs):
@@ -233,6 +408,12 @@ def gui_set(key, **kwargs):
     Widgets typically have a 'disabled' property. The following makes
     it possible to use 'enabled' as the negation of 'disabled'.
     """
+    if SimEngine.headless:
+        # There are no widgets. Keep the value, if any, so that later calls to gui_get see it.
+        # Replace the dictionary rather than update it so that the ParamSnapshot is refreshed.
+        if 'value' in kwargs:
+            SimEngine.values = {**SimEngine.values, key: kwargs['value']}
+        return
     if 'enabled' in kwargs:
         value = kwargs.get('enabled')
         kwargs['disabled'] = not bool(value)
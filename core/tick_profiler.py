@@ -0,0 +1,93 @@
+"""
+Where does a tick's time go? TickProfiler records how long each phase of the SimEngine loop takes.
+
+The phases are
+    read:   gui.WINDOW.read, waiting for and collecting GUI events
+    event:  World.handle_event, for buttons and other widgets
+    step:   World.step
+    record: SimEngine.record_frame, capturing a frame for the FrameRecorder, if there is one
+    draw:   SimEngine.draw_world
+    clock:  self.clock.tick, the delay that holds the loop to the requested frames/second
+A tick's row runs from the start of one step to the start of the next, so it includes the drawing,
+reading, and waiting that follow its step. The last tick of a run ends when the run stops (end_tick).
+The most recent `capacity` rows are kept in a ring buffer.
+
+Turn it on with PyLogo(..., profile=True) or by setting SimEngine.profiler = TickProfiler().
+World.final_thoughts prints the summary.
+"""
+
+import csv
+
+import numpy as np
+
+PHASES = ['read', 'event', 'step', 'record', 'draw', 'clock']
+
+PHASE_INDEX = {phase: i for (i, phase) in enumerate(PHASES)}
+
+
+class TickProfiler:
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        # Seconds per phase for each of the last capacity ticks. Row nbr_ticks % capacity is the next one.
+        self.times = np.zeros((capacity, len(PHASES)))
+        self.nbr_ticks = 0
+        # The phase times of the tick in progress. A list is faster than an array for adding one at a time.
+        self.current = None
+
+    def add(self, phase, seconds):
+        if self.current is not None:
+            self.current[PHASE_INDEX[phase]] += seconds
+
+    def end_tick(self):
+        """ Complete the row of the tick in progress, if any. """
+        if self.current is not None:
+            self.times[self.nbr_ticks % self.capacity] = self.current
+            self.nbr_ticks += 1
+            self.current = None
+
+    def percentiles(self, qs=(50, 95, 99)):
+        """ {phase: [the qs percentiles of its time per tick, in seconds]}, for the phases and their 'total'. """
+        times = self.recent_times()
+        if len(times) == 0:
+            return {}
+        with_total = np.column_stack([times, times.sum(axis=1)])
+        by_phase = np.percentile(with_total, qs, axis=0).T
+        return {phase: list(by_phase[i]) for (i, phase) in enumerate(PHASES + ['total'])}
+
+    def recent_times(self):
+        """ The rows of the completed ticks in the buffer, oldest first. """
+        if self.nbr_ticks <= self.capacity:
+            return self.times[:self.nbr_ticks]
+        oldest = self.nbr_ticks % self.capacity
+        return np.concatenate([self.times[oldest:], self.times[:oldest]])
+
+    def start_tick(self):
+        """ Called just before each step. Completes the row of the tick before it. """
+        self.end_tick()
+        self.current = [0.0] * len(PHASES)
+
+    def summary(self):
+        """ A table of the p50/p95/p99 milliseconds per tick for each phase and the ticks per second. """
+        percentiles = self.percentiles()
+        if not percentiles:
+            return 'No ticks profiled.'
+        lines = [f'Last {min(self.nbr_ticks, self.capacity)} of {self.nbr_ticks} ticks. '
+                 f'Ticks/second: {self.ticks_per_second():.1f}',
+                 f'{"phase":>8} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}']
+        for (phase, (p50, p95, p99)) in percentiles.items():
+            lines.append(f'{phase:>8} {1000*p50:9.3f} {1000*p95:9.3f} {1000*p99:9.3f}')
+        return '\n'.join(lines)
+
+    def ticks_per_second(self):
+        """ Over the ticks in the buffer, from their total phase time, so time spent stopped doesn't count. """
+        times = self.recent_times()
+        elapsed = times.sum()
+        return len(times) / elapsed if elapsed > 0 else 0.0
+
+    def write_csv(self, file_name):
+        """ Write the recent ticks' phase times, in seconds, one row per tick. """
+        with open(file_name, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(PHASES)
+            writer.writerows(self.recent_times().tolist())
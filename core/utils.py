@@ -1,12 +1,12 @@
 
 from __future__ import annotations
 
-# We also cache calls to trig functions
+# The trig functions look their values up in tables
 import math
-from functools import lru_cache
 from math import copysign
 from random import randint
 
+import numpy as np
 from pygame.color import Color
 
 # noinspection PyUnresolvedReferences
@@ -16,35 +16,47 @@ import core.utils as utils
 # ###################### Start trig functions in degrees ###################### #
 # import Python's trig functions, which are in radians. pi radians == 180 degrees
 # These functions expect their arguments in degrees.
+# Angles and headings are normalized to ints in range(360) (see normalize_360), so each function has only
+# 360 possible arguments. Their values are computed once, here, as lists for scalar lookups and as numpy
+# arrays for vectorized code, which can index them with arrays of headings: DX_ARRAY[headings].
+
+COS_TABLE = [math.cos(math.radians(degrees)) for degrees in range(360)]
+SIN_TABLE = [math.sin(math.radians(degrees)) for degrees in range(360)]
+
+# The (dx, dy) of a unit step in the direction of each heading. See dx() and dy().
+DX_TABLE = [COS_TABLE[(90 - heading) % 360] for heading in range(360)]
+# make it negative to account for inverted y axis
+DY_TABLE = [(-1)*SIN_TABLE[(90 - heading) % 360] for heading in range(360)]
+
+COS_ARRAY = np.array(COS_TABLE)
+SIN_ARRAY = np.array(SIN_TABLE)
+DX_ARRAY = np.array(DX_TABLE)
+DY_ARRAY = np.array(DY_TABLE)
+
+# atan2 scales (x, y) so that the larger of abs(x) and abs(y) is 100 and rounds them to ints.
+# ATAN2_ARRAY[y + 100, x + 100] is atan2 of those ints in degrees. ATAN2_TABLE is the same, flattened.
+ATAN2_SCALE = 100
+ATAN2_ARRAY = np.degrees(np.arctan2(*np.mgrid[-ATAN2_SCALE:ATAN2_SCALE+1, -ATAN2_SCALE:ATAN2_SCALE+1]))
+ATAN2_TABLE = ATAN2_ARRAY.ravel().tolist()
 
 
 def atan2(y, x):
     xy_max = max(abs(x), abs(y))
-    (y_n, x_n) = (int(round(100*y/xy_max)), int(round(100*x/xy_max)))
+    (y_n, x_n) = (int(round(ATAN2_SCALE*y/xy_max)), int(round(ATAN2_SCALE*x/xy_max)))
     return atan2_normalized(y_n, x_n)
 
 
-@lru_cache(maxsize=1024)
 def atan2_normalized(y, x):
-    return math.degrees(math.atan2(y, x))
+    """ y and x are ints in [-100, 100]. """
+    return ATAN2_TABLE[(y + ATAN2_SCALE)*(2*ATAN2_SCALE + 1) + x + ATAN2_SCALE]
 
 
 def cos(degrees):
-    return _cos(normalize_360(degrees))
-
-
-@lru_cache(maxsize=512)
-def _cos(degrees):
-    return math.cos(math.radians(degrees))
+    return COS_TABLE[normalize_360(degrees)]
 
 
 def sin(degrees):
-    return _sin(normalize_360(degrees))
-
-
-@lru_cache(maxsize=512)
-def _sin(degrees):
-    return math.sin(math.radians(degrees))
+    return SIN_TABLE[normalize_360(degrees)]
 
 
 # ###################### End trig functions in degrees ###################### #
@@ -80,26 +92,11 @@ def dxdy_to_heading(dx, dy, default_heading=None):
 
 
 def dx(heading):
-    return _dx(heading)
-
-
-@lru_cache(maxsize=512)
-def _dx(heading):
-    angle = heading_to_angle(heading)
-    delta_x = utils.cos(angle)
-    return delta_x
+    return DX_TABLE[normalize_360(heading)]
 
 
 def dy(heading):
-    return _dy(heading)
-
-
-@lru_cache(maxsize=512)
-def _dy(heading):
-    angle = heading_to_angle(heading)
-    delta_y = utils.sin(angle)
-    # make it negative to account for inverted y axis
-    return (-1)*delta_y
+    return DY_TABLE[normalize_360(heading)]
 
 
 def extract_class_name(full_class_name: type):
@@ -1,23 +1,64 @@
 
 from __future__ import annotations
 
+from itertools import groupby
 from math import sqrt
 from typing import Tuple
 
 import numpy as np
 from pygame.color import Color
 from pygame.rect import Rect
-from pygame.surface import Surface
 
+import core.cache_registry as cache_registry
 import core.gui as gui
 # Importing the file itself eliminates the need for a globals declaration
 # noinspection PyUnresolvedReferences
 import core.world_patch_block as world
 from core.gui import SHAPES
 from core.pairs import Pixel_xy, RowCol, center_pixel
+from core.sim_engine import SimEngine
 from core.utils import get_class_name
 
 
+# The (row, col) offsets of the neighbors of a patch, by neighborhood kind.
+NEIGHBOR_DELTAS = {'4': ((-1, 0), (1, 0), (0, -1), (0, 1)),
+                   '8': ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)),
+                   '24': ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1),
+                          (-2, -2), (-1, -2), (0, -2), (1, -2), (2, -2),
+                          (-2, -1), (2, -1),
+                          (-2, 0), (2, 0),
+                          (-2, 1), (2, 1),
+                          (-2, 2), (-1, 2), (0, 2), (1, 2), (2, 2),
+                          ),
+                   }
+
+
+def neighbor_deltas(kind):
+    """
+    kind is '4', '8', or '24', or an int radius, which means all the patches in the
+    (2*radius + 1) x (2*radius + 1) square around a patch, other than the patch itself.
+    """
+    if kind in NEIGHBOR_DELTAS:
+        return NEIGHBOR_DELTAS[kind]
+    return tuple((dr, dc) for dr in range(-kind, kind+1) for dc in range(-kind, kind+1) if (dr, dc) != (0, 0))
+
+
+@cache_registry.cached(maxsize=32)
+def neighbor_table(kind, rows, cols) -> np.ndarray:
+    """
+    An int32 array of shape (rows*cols, nbr_neighbors). Row i holds the flat indices (r*cols + c)
+    of the neighbors of the patch with flat index i, in neighbor_deltas(kind) order, wrapping as in RowCol.wrap.
+    Built once per kind and board size and shared by all patches. It is read-only.
+    """
+    deltas = np.array(neighbor_deltas(kind), dtype=np.int32)
+    (patch_rows, patch_cols) = np.divmod(np.arange(rows*cols, dtype=np.int32), cols)
+    nbr_rows = (patch_rows[:, np.newaxis] + deltas[:, 0]) % rows
+    nbr_cols = (patch_cols[:, np.newaxis] + deltas[:, 1]) % cols
+    table = (nbr_rows * cols + nbr_cols).astype(np.int32)
+    table.flags.writeable = False
+    return table
+
+
 class Block:
     """
     A generic patch/agent. Has a Pixel_xy but not necessarily a RowCol. Has a Color.
@@ -32,10 +73,13 @@ class Block:
         # noinspection PyTypeChecker
         sum_pixel: Pixel_xy = center_pixel + Pixel_xy((1, 1))
         self.rect.center = sum_pixel
-        self.image = Surface((self.rect.w, self.rect.h))
         self.color = self.base_color = color
         self._label = None
         self.highlight = None
+        # For World.draw_dirty. dirty means this block has changed since it was last drawn.
+        # drawn_rect is the part of the screen it covered when it was last drawn.
+        self.dirty = True
+        self.drawn_rect = None
 
     def distance_to_xy(self, xy: Pixel_xy):
         x_dist = self.center_pixel.x - xy.x
@@ -45,14 +89,19 @@ class Block:
 
     # The actual drawing (blit and draw_line) takes place in core.gui.
     def draw(self, shape_name=None):
-        if self.label:
-            self.draw_label()
-        if isinstance(self, Patch) or shape_name in SHAPES:
+        label_rect = self.draw_label() if self.label else None
+        if isinstance(self, Patch):
+            drawn_rect = gui.fill_rect(self.color, self.rect)
+        elif shape_name in SHAPES:
             self.rect.center = self.center_pixel
             # self.rect = Rect(center=self.rect.center)
-            gui.blit(self.image, self.rect)
+            drawn_rect = gui.blit(self.image, self.rect)
         else:
-            gui.draw(self, shape_name=shape_name)
+            drawn_rect = gui.draw(self, shape_name=shape_name)
+        if drawn_rect is None:
+            drawn_rect = Rect(self.rect)
+        self.drawn_rect = drawn_rect if label_rect is None else drawn_rect.union(label_rect)
+        self.dirty = False
 
     def draw_label(self):
         offset = Block.patch_text_offset if isinstance(self, Patch) else Block.agent_text_offset
@@ -61,7 +110,7 @@ class Block:
                      Color('white') if isinstance(self, Patch) and self.color == Color('black') else self.color
         obj_center = self.rect.center
         label = self.label
-        gui.draw_label(label, text_center, obj_center, line_color)
+        return gui.draw_label(label, text_center, obj_center, line_color)
 
     @property
     def label(self):
@@ -70,16 +119,72 @@ class Block:
     @label.setter
     def label(self, value):
         self._label = value
+        self.dirty = True
+        if isinstance(self, Patch):
+            if value:
+                World.labeled_patches.add(self)
+            else:
+                World.labeled_patches.discard(self)
 
     def set_color(self, color):
         self.color = color
-        self.image.fill(color)
+        self.dirty = True
+
+
+class PatchVariable:
+    """
+    A NetLogo "patches-own" variable. Declare it as a class attribute of a Patch subclass:
+
+        class Life_Patch(OnOffPatch):
+            live_neighbors = PatchVariable(int, 0)
+
+    The values for all the patches live in one numpy array of shape (PATCH_ROWS, PATCH_COLS),
+    Life_Patch.live_neighbors.array (also World.patch_vars['live_neighbors']). It is created when
+    the World creates its patches. patch.live_neighbors reads and writes that patch's element.
+    Whole-grid computations can work on the array directly.
+    """
+
+    def __init__(self, dtype=float, default=0):
+        self.array: np.ndarray = None
+        self.default = default
+        self.dtype = dtype
+        self.name = None
+
+    def __get__(self, patch, owner=None):
+        if patch is None:
+            return self
+        # .item() returns a Python value rather than a numpy scalar.
+        return self.array.item(patch.array_index)
+
+    def __set__(self, patch, value):
+        self.array[patch.array_index] = value
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def allocate(self):
+        self.array = np.full((gui.PATCH_ROWS, gui.PATCH_COLS), self.default, dtype=self.dtype)
+        return self.array
+
+    @staticmethod
+    def declared_in(patch_class):
+        """ The PatchVariables of patch_class, including inherited ones, by name. """
+        return {name: attr for cls in reversed(patch_class.__mro__) for (name, attr) in vars(cls).items()
+                if isinstance(attr, PatchVariable)}
 
 
 class Patch(Block):
     def __init__(self, row_col: RowCol, color=Color('black')):
         super().__init__(row_col.patch_to_center_pixel(), color)
         self.row_col = row_col
+        # Patches don't move, so they always cover the same square.
+        self.rect.center = self.center_pixel
+        self.drawn_rect = Rect(self.rect)
+        # Where this patch's values are in World.patches_array and in the PatchVariable arrays,
+        # and where it is in World.patches and in the rows of neighbor_table().
+        self.array_index = (row_col.row, row_col.col)
+        self.flat_index = row_col.row * gui.PATCH_COLS + row_col.col
+        World.patch_colors[self.array_index] = color[:3]
         self.agents = None
         self._neighbors_4 = None
         self._neighbors_8 = None
@@ -107,28 +212,25 @@ class Patch(Block):
 
     def neighbors_4(self):
         if self._neighbors_4 is None:
-            cardinal_deltas = ((-1, 0), (1, 0), (0, -1), (0, 1))
-            self._neighbors_4 = self.neighbors(cardinal_deltas)
+            self._neighbors_4 = self.neighbors_of_kind('4')
         return self._neighbors_4
 
     def neighbors_8(self):
         if self._neighbors_8 is None:
-            eight_deltas = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-            self._neighbors_8 = self.neighbors(eight_deltas)
+            self._neighbors_8 = self.neighbors_of_kind('8')
         return self._neighbors_8
 
     def neighbors_24(self):
         if self._neighbors_24 is None:
-            twenty_four_deltas = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1),
-                                  (-2, -2), (-1, -2), (0, -2), (1, -2), (2, -2),
-                                  (-2, -1), (2, -1),
-                                  (-2, 0), (2, 0),
-                                  (-2, 1), (2, 1),
-                                  (-2, 2), (-1, 2), (0, 2), (1, 2), (2, 2),
-                                  )
-            self._neighbors_24 = self.neighbors(twenty_four_deltas)
+            self._neighbors_24 = self.neighbors_of_kind('24')
         return self._neighbors_24
 
+    def neighbors_of_kind(self, kind):
+        """ The neighbors of this patch as listed in its row of the shared neighbor_table. """
+        patches = World.patches
+        table = neighbor_table(kind, gui.PATCH_ROWS, gui.PATCH_COLS)
+        return [patches[i] for i in table[self.flat_index].tolist()]
+
     def neighbors(self, deltas):
         """
         The neighbors of this patch determined by the deltas.
@@ -143,14 +245,176 @@ class Patch(Block):
     def remove_agent(self, agent):
         self.agents.remove(agent)
 
+    def set_color(self, color):
+        super().set_color(color)
+        World.patch_colors[self.array_index] = color[:3]
+
+
+class LinkSet(set):
+    """
+    The set of links in the World, World.links. It also indexes the links in two ways, which every
+    mutating set method keeps current:
+        by_hash: {link.hash_object: link}, so finding the link between two agents is a dictionary lookup.
+        incident: {agent: set of the links that include the agent}, so an agent's links are found in O(degree).
+    Non-mutating set operations such as | and - return ordinary sets.
+
+    version counts the changes to the set and to the links' colors and widths. World.draw_links uses it
+    to decide when to regroup the links. See segments.
+    """
+
+    def __init__(self, links=()):
+        super().__init__()
+        self.by_hash = {}
+        self.incident = {}
+        self.version = 0
+        # The drawing groups and the version they were built for. See segments.
+        self.groups = None
+        self.groups_version = None
+        self.labeled = []
+        self.segment_ends = None
+        self.unbatched = []
+        self.update(links)
+
+    def __iand__(self, links):
+        self.intersection_update(links)
+        return self
+
+    def __ior__(self, links):
+        self.update(links)
+        return self
+
+    def __isub__(self, links):
+        self.difference_update(links)
+        return self
+
+    def __ixor__(self, links):
+        self.symmetric_difference_update(links)
+        return self
+
+    def add(self, lnk):
+        if lnk not in self:
+            super().add(lnk)
+            self.version += 1
+            self.by_hash[lnk.hash_object] = lnk
+            for agent in (lnk.agent_1, lnk.agent_2):
+                self.incident.setdefault(agent, set()).add(lnk)
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+        self.by_hash.clear()
+        self.incident.clear()
+
+    def difference_update(self, *link_collections):
+        for links in link_collections:
+            # Copy first in case links is one of this LinkSet's own incidence sets.
+            for lnk in list(links):
+                self.discard(lnk)
+
+    def discard(self, lnk):
+        if lnk in self:
+            self.remove(lnk)
+
+    def get(self, hash_obj):
+        """ The link with this hash_object, or None. """
+        return self.by_hash.get(hash_obj, None)
+
+    def intersection_update(self, *link_collections):
+        keep = set(self).intersection(*link_collections)
+        self.difference_update(set(self) - keep)
+
+    def links_of(self, agent):
+        """ The links that include agent. Don't modify the returned set. """
+        return self.incident.get(agent, set())
+
+    def pop(self):
+        lnk = super().pop()
+        self.unindex(lnk)
+        return lnk
+
+    def remove(self, lnk):
+        super().remove(lnk)
+        self.unindex(lnk)
+
+    def segments(self):
+        """
+        The endpoints of the links that can be drawn in batches, {(rgb, width): [(start, end), ...]}, where
+        start and end are (x, y) pixels. The links are regrouped only when the version has changed,
+        and the endpoints are collected again only when one of the linked agents has moved (is dirty).
+        Also sets self.unbatched, the links whose class draws them some other way, and self.labeled,
+        the batched links whose class has labels.
+        """
+        if self.groups_version != self.version:
+            self.groups = {}
+            self.labeled = []
+            self.unbatched = []
+            for lnk in self:
+                if lnk.batchable():
+                    self.groups.setdefault((tuple(lnk.color)[:3], lnk.width), []).append(lnk)
+                    if lnk.has_label():
+                        self.labeled.append(lnk)
+                else:
+                    self.unbatched.append(lnk)
+            self.groups_version = self.version
+            self.segment_ends = None
+
+        if self.segment_ends is None or any(agent.dirty for agent in self.incident):
+            self.segment_ends = {key: [(lnk.agent_1.center_pixel.as_tuple(), lnk.agent_2.center_pixel.as_tuple())
+                                       for lnk in links]
+                                 for (key, links) in self.groups.items()}
+        return self.segment_ends
+
+    def symmetric_difference_update(self, links):
+        # Split links before changing anything, in case links is this LinkSet or one of its incidence sets.
+        links = set(links)
+        (old_links, new_links) = (links & self, links - self)
+        self.difference_update(old_links)
+        self.update(new_links)
+
+    def unindex(self, lnk):
+        # lnk may be a different, but equal, Link object from the one stored. Unindex the stored one.
+        self.version += 1
+        stored_link = self.by_hash.pop(lnk.hash_object)
+        for agent in (stored_link.agent_1, stored_link.agent_2):
+            agent_links = self.incident[agent]
+            agent_links.discard(stored_link)
+            if not agent_links:
+                del self.incident[agent]
+
+    def update(self, *link_collections):
+        for links in link_collections:
+            for lnk in links:
+                self.add(lnk)
+
 
 class World:
+    """
+    If a World subclass sets incremental_draw = True, SimEngine.draw_world redraws only what has changed
+    since the previous frame (see draw_dirty) rather than the whole screen. That works as long as the
+    patches and agents are changed through their methods (set_color, move_to_xy, set_heading, label, ...),
+    which mark them dirty, and are drawn by Block.draw.
+    """
 
     agents = None
-    links = None
+    # The columns of the ArrayAgents (see core.agent_arrays), if there are any.
+    agent_store = None
+    # For incremental drawing. dirty_rects are screen areas to redraw even though no block there is dirty,
+    # e.g., where a deleted agent was. full_redraw is set when the next frame must be drawn in full.
+    dirty_rects = []
+    full_redraw = True
+    incremental_draw = False
+    # The patches that have labels. They are drawn after the other patches.
+    labeled_patches = None
+    links: LinkSet = None
 
     patches = None
     patches_array: np.ndarray = None
+    # The RGB color of each patch, shape (PATCH_ROWS, PATCH_COLS, 3), kept up to date by Patch.set_color.
+    patch_colors: np.ndarray = None
+    # The screen image of the patches, indexed (x, y) as in pg.surfarray. See draw_patches.
+    patch_pixels: np.ndarray = None
+    # The arrays of the patch class's PatchVariables, by name.
+    patch_vars = None
 
     ticks = None
 
@@ -171,7 +435,9 @@ class World:
     @staticmethod
     def clear_all():
         World.agents = set()
-        World.links = set()
+        if World.agent_store is not None:
+            World.agent_store.clear()
+        World.links = LinkSet()
         for patch in World.patches:
             patch.clear()
 
@@ -193,11 +459,22 @@ class World:
         return agent_list
 
     def create_patches_array(self):
+        # The arrays must exist before the patches are created since their __init__ methods may set them.
+        World.patch_colors = np.zeros((gui.PATCH_ROWS, gui.PATCH_COLS, 3), dtype=np.uint8)
+        World.labeled_patches = set()
+        # The gutter pixels between the patches never change. They are the background color.
+        World.patch_pixels = np.empty((gui.SCREEN_PIXEL_WIDTH(), gui.SCREEN_PIXEL_HEIGHT(), 3), dtype=np.uint8)
+        World.patch_pixels[:] = tuple(Color(gui.SCREEN_COLOR))[:3]
+        World.patch_vars = {name: patch_var.allocate()
+                            for (name, patch_var) in PatchVariable.declared_in(self.patch_class).items()}
         patch_pseudo_array = [[self.patch_class(RowCol((r, c))) for c in range(gui.PATCH_COLS)]
                               for r in range(gui.PATCH_ROWS)]
         World.patches_array = np.array(patch_pseudo_array)
         # .flat is an iterator. Can't use it more than once.
         World.patches = list(World.patches_array.flat)
+        # Build the neighbor tables now rather than during the first step.
+        for kind in NEIGHBOR_DELTAS:
+            neighbor_table(kind, gui.PATCH_ROWS, gui.PATCH_COLS)
 
     def create_random_agent(self, color=None, shape_name='netlogo_figure', scale=1.4):
         """
@@ -223,27 +500,140 @@ class World:
     def draw(self):
         """ 
         Draw the world by drawing the patches and agents. 
-        Should check to see which really need to be re-drawn.
+        See draw_dirty for drawing just the ones that need to be re-drawn.
         """
-        for patch in World.patches:
-            patch.draw()
+        if self.patch_class.draw is Patch.draw:
+            World.draw_patches()
+        else:
+            # The patch class draws itself some other way.
+            for patch in World.patches:
+                patch.draw()
+
+        World.draw_links()
+
+        # Each run of consecutive plain circles and nodes of the same color and radius is drawn by a single
+        # gui.draw_circles call, so the agents are still drawn in their usual order.
+        for ((rgb, radius), agents) in groupby(World.agents, World.circle_key):
+            if radius is None:
+                for agent in agents:
+                    agent.draw()
+                continue
+            agents = list(agents)
+            gui.draw_circles([agent.center_pixel.as_int().as_tuple() for agent in agents], radius, rgb)
+            for agent in agents:
+                agent.drawn_rect = Rect(0, 0, 2*radius + 1, 2*radius + 1)
+                agent.drawn_rect.center = agent.center_pixel.as_int().as_tuple()
+                agent.dirty = False
+
+        World.dirty_rects = []
+        World.full_redraw = False
+
+    @staticmethod
+    def circle_key(agent):
+        """ (rgb, radius) if World.draw can draw agent as a plain circle, else (None, None). See Agent.batch_radius. """
+        radius = agent.batch_radius()
+        return (None, None) if radius is None else (tuple(agent.color)[:3], radius)
 
-        for link in World.links:
-            link.draw()
+    @staticmethod
+    def draw_links():
+        """
+        Draw the links. Those that Link.draw would draw are drawn by one gui.draw_segments call per
+        (color, width), from endpoints cached by World.links.segments, with their labels on top.
+        The others draw themselves.
+        """
+        for ((rgb, width), segments) in World.links.segments().items():
+            gui.draw_segments(segments, rgb, width)
+        for lnk in World.links.unbatched:
+            lnk.draw()
+        for lnk in World.links.labeled:
+            label = lnk.label
+            if label is not None:
+                lnk.draw_label(label)
 
+    @staticmethod
+    def draw_patches():
+        """
+        Draw all the patches with a single blit. Each patch's color, from World.patch_colors, fills its
+        PATCH_SIZE x PATCH_SIZE square of World.patch_pixels. Patch (row, col) starts at pixel
+        (1 + col*BLOCK_SPACING(), 1 + row*BLOCK_SPACING()), which leaves a one-pixel gutter around it.
+        The labels are drawn on top.
+        """
+        spacing = gui.BLOCK_SPACING()
+        # A view of patch_pixels with axes (col, x within the patch's block, row, y within the block, rgb).
+        blocks = World.patch_pixels[1:, 1:].reshape(gui.PATCH_COLS, spacing, gui.PATCH_ROWS, spacing, 3)
+        blocks[:, :gui.PATCH_SIZE, :, :gui.PATCH_SIZE] = \
+            World.patch_colors.transpose(1, 0, 2)[:, np.newaxis, :, np.newaxis]
+        gui.blit_array(World.patch_pixels)
+
+        if World.world.incremental_draw:
+            for patch in World.patches:
+                patch.dirty = False
+        for patch in World.labeled_patches:
+            patch.drawn_rect = patch.rect.union(patch.draw_label())
+            patch.dirty = False
+
+    def draw_dirty(self):
+        """
+        Redraw the dirty patches and agents, after erasing where they were. Anything that overlaps an erased
+        area is redrawn as well. Returns the list of screen rectangles that changed, for pg.display.update().
+        Links are not handled: they can cross the whole screen. See needs_full_redraw.
+        """
+        blocks = World.patches + list(World.agents)
+        dirty_blocks = [block for block in blocks if block.dirty]
+        screen_color = Color(gui.SCREEN_COLOR)
+        # If most of the blocks changed, drawing everything is faster.
+        if 2*len(dirty_blocks) > len(blocks):
+            gui.SCREEN.fill(screen_color)
+            self.draw()
+            return [gui.SCREEN.get_rect()]
+
+        region = World.dirty_rects + [block.drawn_rect for block in dirty_blocks if block.drawn_rect]
+        World.dirty_rects = []
+        if not dirty_blocks and not region:
+            return []
+
+        # Blocks are redrawn whole, so grow the region until no block partly inside it is left out.
+        no_rect = Rect(0, 0, 0, 0)
+        drawn_rects = [block.drawn_rect if block.drawn_rect else no_rect for block in blocks]
+        to_draw = set(dirty_blocks)
+        pending = list(region)
+        while pending:
+            for i in pending.pop().collidelistall(drawn_rects):
+                if blocks[i] not in to_draw:
+                    to_draw.add(blocks[i])
+                    region.append(drawn_rects[i])
+                    pending.append(drawn_rects[i])
+
+        for rect in region:
+            gui.SCREEN.fill(screen_color, rect)
+        # Draw in the same order as World.draw: patches, then patch labels, then agents.
+        # Patches don't overlap, so their order doesn't matter.
+        patches_to_draw = [block for block in to_draw if isinstance(block, Patch)]
+        for patch in patches_to_draw:
+            patch.draw()
+        for patch in World.labeled_patches.intersection(patches_to_draw):
+            patch.drawn_rect = patch.rect.union(patch.draw_label())
         for agent in World.agents:
-            agent.draw()
+            if agent in to_draw:
+                agent.draw()
+
+        # A dirty block may now cover agents that were not redrawn. Agents go on top, so redraw those.
+        new_rects = [block.drawn_rect for block in dirty_blocks]
+        for agent in World.agents:
+            if agent not in to_draw and agent.drawn_rect and agent.drawn_rect.collidelist(new_rects) != -1:
+                agent.draw()
+        return region + [block.drawn_rect for block in to_draw]
+
+    @staticmethod
+    def needs_full_redraw():
+        return World.full_redraw or bool(World.links)
 
     def final_thoughts(self):
         """ Add any final tests, data gathering, summa  rization, etc. here. """
-        pass
-        # Uncomment this code to see how well the (@lru) caches work.
-        # print()
-        # for fn in [utils._heading_to_dxdy_int, utils._dx_int, utils._dy_int,
-        #            utils.atan2_normalized, utils._cos_int, utils._sin_int]:
-        #     if fn == utils.atan2:
-        #         print()
-        #     print(f'{str(fn.__wrapped__).split(" ")[1]}: {fn.cache_info()}')
+        if SimEngine.profiler:
+            print(SimEngine.profiler.summary())
+        # Uncomment this line to see how well the caches work. See core.cache_registry.
+        # print(cache_registry.report())
 
     def handle_event(self, _event):
         pass
@@ -255,6 +645,74 @@ class World:
     def mouse_click(self, xy):
         pass
 
+    @staticmethod
+    def neighbor_count(mask, kind='8', wrap=True) -> np.ndarray:
+        """
+        NetLogo's count neighbors with [...] for every patch at once.
+        mask is a boolean array of shape (PATCH_ROWS, PATCH_COLS), e.g., Life_Patch.is_on.array.
+        """
+        return World.neighbor_sum(mask, kind, wrap)
+
+    @staticmethod
+    def neighbor_mean(array, kind='8', wrap=True) -> np.ndarray:
+        """
+        The mean of array over each patch's neighbors. Without wrap, patches along the edges
+        have fewer neighbors, and the mean is taken over the ones they have.
+        """
+        sums = World.neighbor_sum(array.astype(float), kind, wrap)
+        if wrap:
+            return sums / len(neighbor_deltas(kind))
+        nbr_neighbors = World.neighbor_sum(np.ones(array.shape[:2]), kind, wrap=False)
+        return sums / nbr_neighbors.reshape(nbr_neighbors.shape + (1,)*(array.ndim - 2))
+
+    @staticmethod
+    def neighbor_sum(array, kind='8', wrap=True) -> np.ndarray:
+        """
+        For every patch, the sum of array over its neighbors, computed with whole-array operations
+        rather than a Python loop over the patches. array has shape (PATCH_ROWS, PATCH_COLS, ...).
+        kind is as in neighbor_deltas(). With wrap, the board is a torus, as in RowCol.wrap, and the
+        neighbors are gathered through the shared neighbor_table. Without wrap, the array is padded
+        with 0's and summed as one shifted slice per delta, so positions off the board contribute nothing.
+        The sums are int64 for bool and integer arrays and float64 for float arrays: summing in the
+        array's own dtype would or bools together and overflow small ints such as uint8.
+        """
+        (rows, cols) = array.shape[:2]
+        wide_type = np.float64 if np.issubdtype(array.dtype, np.inexact) else np.int64
+        sum_dtype = np.result_type(array.dtype, wide_type)
+        if wrap:
+            flat = array.reshape((rows*cols, ) + array.shape[2:])
+            total = flat[neighbor_table(kind, rows, cols)].sum(axis=1, dtype=sum_dtype)
+            return total.reshape(array.shape)
+
+        deltas = neighbor_deltas(kind)
+        radius = max(max(abs(dr), abs(dc)) for (dr, dc) in deltas)
+        padding = ((radius, radius), (radius, radius)) + ((0, 0),)*(array.ndim - 2)
+        padded = np.pad(array, padding)
+        total = np.zeros(array.shape, dtype=sum_dtype)
+        for (dr, dc) in deltas:
+            total += padded[radius+dr:radius+dr+rows, radius+dc:radius+dc+cols]
+        return total
+
+    @staticmethod
+    def patches_around(patch, cell_radius, wrap=True):
+        """
+        The patches in the (2*cell_radius + 1)-patch square centered on patch, including patch itself.
+        With wrap, the square wraps around the edges, as in RowCol.wrap. Otherwise it is cut off at the edges.
+        Since Patch.agents holds the agents on each patch, this is how agents are found near a location
+        without looking at all of them.
+        """
+        (row, col) = patch.array_index
+        row_range = range(row - cell_radius, row + cell_radius + 1)
+        col_range = range(col - cell_radius, col + cell_radius + 1)
+        if wrap:
+            # Use sets in case the square is larger than the board.
+            rows = sorted({r % gui.PATCH_ROWS for r in row_range})
+            cols = sorted({c % gui.PATCH_COLS for c in col_range})
+        else:
+            rows = [r for r in row_range if 0 <= r < gui.PATCH_ROWS]
+            cols = [c for c in col_range if 0 <= c < gui.PATCH_COLS]
+        return World.patches_array[np.ix_(rows, cols)].flat
+
     def pixel_tuple_to_patch(self, xy: Tuple[int, int]):
         """
         Get the patch RowCol for this pixel
@@ -270,8 +728,24 @@ class World:
         patch = World.patches_array[row_col.row, row_col.col]
         return patch
 
+    @staticmethod
+    def set_patch_colors(rgb_array):
+        """
+        Color all the patches at once from an array of shape (PATCH_ROWS, PATCH_COLS, 3), e.g., one computed
+        from a patch variable by a vectorized color map. Only the patches whose color changes are touched.
+        """
+        changed = np.any(World.patch_colors != rgb_array, axis=2)
+        for patch in World.patches_array[changed]:
+            patch.set_color(Color(*rgb_array[patch.array_index].tolist()))
+
     def reset_all(self):
         self.done = False
+        World.full_redraw = True
+        # Each run's cache statistics start from zero. The entries are kept: the geometry caches,
+        # e.g., neighbor_table, are keyed by the board and patch sizes, so a new size gets new entries.
+        cache_registry.reset_stats()
+        # The screen size or the 'Bounce?' setting may differ from the last run.
+        Pixel_xy.set_topology()
         self.clear_all()
         self.reset_ticks()
 
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The tests run without a display. They import core and Examples from the PyLogo directory.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,10 @@
+import pytest
+
+from core.agent import shape_sprite
+
+
+@pytest.mark.parametrize('patch_size', [3, 11, 21])
+def test_shape_scales_with_patch_size(patch_size):
+    sprite = shape_sprite('netlogo_figure', (255, 0, 0), 1.4, patch_size)
+    # The polygon is scaled by patch_size, so it reaches the edges of its patch_size-based Surface.
+    assert sprite.get_bounding_rect().size == sprite.get_size()
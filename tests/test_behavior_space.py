@@ -0,0 +1,24 @@
+import core.gui as gui
+from core.behavior_space import run_experiment
+from Examples.game_of_life import Life_Patch, Life_World, gol_left_upper
+
+
+def nbr_patches(world):
+    return len(world.patches)
+
+
+def screen_size(world):
+    return gui.SCREEN.get_size()
+
+
+def sweep(board_rows_cols):
+    return run_experiment(Life_World, {'density': [35]}, reporters={'patches': nbr_patches, 'screen': screen_size},
+                          max_ticks=2, gui_left_upper=gol_left_upper, patch_class=Life_Patch, patch_size=11,
+                          board_rows_cols=board_rows_cols, max_workers=1)
+
+
+def test_board_size_follows_each_sweep():
+    for (rows, cols) in [(11, 11), (21, 21), (11, 11)]:
+        [row] = sweep((rows, cols))
+        assert row['patches'] == rows * cols
+        assert row['screen'] == (cols * 12 + 1, rows * 12 + 1)
@@ -0,0 +1,41 @@
+import core.cache_registry as cache_registry
+
+
+def make_cache(maxsize):
+    @cache_registry.cached(maxsize=maxsize)
+    def square(x):
+        return x * x
+    return square
+
+
+def test_reset_stats_keeps_entries():
+    square = make_cache(maxsize=2)
+    for x in [1, 2, 1]:
+        square(x)
+    square.reset_stats()
+    assert square.stats()['hits'] == square.stats()['misses'] == 0
+    assert square.stats()['size'] == 2
+    square(1)
+    stats = square.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 0, 0)
+
+
+def test_evictions_after_reset_stats():
+    square = make_cache(maxsize=2)
+    square(1)
+    square(2)
+    square.reset_stats()
+    # 3 evicts 2 (1 was used more recently), and 4 evicts 1.
+    for x in [1, 3, 4]:
+        square(x)
+    stats = square.stats()
+    assert (stats['hits'], stats['misses'], stats['size'], stats['evictions']) == (1, 2, 2, 2)
+
+
+def test_world_reset_keeps_neighbor_table():
+    from core.world_patch_block import neighbor_table
+    neighbor_table(1, 5, 7)
+    cache_registry.reset_stats()
+    neighbor_table(1, 5, 7)
+    stats = neighbor_table.stats()
+    assert (stats['hits'], stats['misses']) == (1, 0)
@@ -0,0 +1,86 @@
+import pytest
+
+from core.world_patch_block import LinkSet
+
+
+class StubLink:
+    """ Just what LinkSet uses of a Link: its agents and hash_object, which also define equality. """
+
+    def __init__(self, agent_1, agent_2):
+        (self.agent_1, self.agent_2) = (agent_1, agent_2)
+        self.hash_object = frozenset((agent_1, agent_2))
+
+    def __eq__(self, other):
+        return self.hash_object == other.hash_object
+
+    def __hash__(self):
+        return hash(self.hash_object)
+
+    def __repr__(self):
+        return f'StubLink{tuple(sorted(self.hash_object))}'
+
+
+AB, BC, CD, DA = (StubLink('a', 'b'), StubLink('b', 'c'), StubLink('c', 'd'), StubLink('d', 'a'))
+
+
+def assert_indexed(links):
+    """ by_hash and incident describe exactly the links in the set. """
+    assert links.by_hash == {lnk.hash_object: lnk for lnk in links}
+    incident = {}
+    for lnk in links:
+        for agent in (lnk.agent_1, lnk.agent_2):
+            incident.setdefault(agent, set()).add(lnk)
+    assert links.incident == incident
+
+
+def mutate(name, links, other):
+    if name.startswith('__'):
+        assert getattr(links, name)(other) is links
+    else:
+        getattr(links, name)(other)
+
+
+@pytest.mark.parametrize('name, other, expected', [
+    ('__iand__', {AB, CD}, {AB}),
+    ('__ior__', {CD, DA}, {AB, BC, CD, DA}),
+    ('__isub__', {AB}, {BC}),
+    ('__ixor__', {BC, CD}, {AB, CD}),
+    ('difference_update', {AB}, {BC}),
+    ('intersection_update', {AB, CD}, {AB}),
+    ('symmetric_difference_update', {BC, CD}, {AB, CD}),
+    ('update', {CD, DA}, {AB, BC, CD, DA}),
+])
+def test_set_operations_keep_indexes(name, other, expected):
+    links = LinkSet([AB, BC])
+    version = links.version
+    mutate(name, links, other)
+    assert set(links) == expected
+    assert links.version > version
+    assert_indexed(links)
+
+
+@pytest.mark.parametrize('name', ['add', 'discard', 'remove'])
+def test_element_operations_keep_indexes(name):
+    links = LinkSet([AB, BC])
+    getattr(links, name)(CD if name == 'add' else BC)
+    assert set(links) == ({AB, BC, CD} if name == 'add' else {AB})
+    assert_indexed(links)
+
+
+def test_pop_and_clear_keep_indexes():
+    links = LinkSet([AB, BC])
+    popped = links.pop()
+    assert set(links) == {AB, BC} - {popped}
+    assert_indexed(links)
+    links.clear()
+    assert not links and not links.by_hash and not links.incident
+
+
+def test_operations_with_own_incidence_set():
+    links = LinkSet([AB, BC, CD])
+    links ^= links.links_of('b')
+    assert set(links) == {CD}
+    assert_indexed(links)
+    links -= links.links_of('c')
+    assert not links
+    assert_indexed(links)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from core.world_patch_block import World, neighbor_deltas
+
+
+@pytest.mark.parametrize('wrap', [True, False])
+def test_bool_array_is_counted(wrap):
+    mask = np.ones((5, 6), dtype=bool)
+    counts = World.neighbor_sum(mask, '8', wrap)
+    assert counts.dtype == np.int64
+    assert counts[2, 2] == 8
+    assert np.array_equal(World.neighbor_count(mask, '8', wrap), counts)
+
+
+@pytest.mark.parametrize('wrap', [True, False])
+def test_uint8_array_does_not_overflow(wrap):
+    array = np.full((7, 7), 20, dtype=np.uint8)
+    sums = World.neighbor_sum(array, '24', wrap)
+    assert sums[3, 3] == 20 * len(neighbor_deltas('24')) == 480
+
+
+def test_wrapped_counts_at_the_corners():
+    mask = np.zeros((4, 5), dtype=bool)
+    mask[0, 0] = True
+    counts = World.neighbor_sum(mask, '8', wrap=True)
+    # (0, 0)'s neighbors around the torus include the opposite corner.
+    assert counts[3, 4] == 1 and counts[1, 1] == 1 and counts[0, 0] == 0
+    assert counts.sum() == 8
+
+
+def test_float_array_keeps_fractions():
+    array = np.full((4, 4), 0.25, dtype=np.float32)
+    means = World.neighbor_mean(array, '4')
+    assert means.dtype == np.float64
+    assert np.allclose(World.neighbor_sum(array, '4'), 1.0)
+    assert np.allclose(means, 0.25)
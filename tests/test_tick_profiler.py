@@ -0,0 +1,30 @@
+import pytest
+
+from core.tick_profiler import TickProfiler
+
+
+def profile(nbr_ticks, seconds_per_tick, capacity=1000):
+    profiler = TickProfiler(capacity=capacity)
+    for _ in range(nbr_ticks):
+        profiler.start_tick()
+        profiler.add('step', seconds_per_tick / 2)
+        profiler.add('draw', seconds_per_tick / 2)
+    profiler.end_tick()
+    return profiler
+
+
+def test_last_tick_is_counted():
+    profiler = profile(5, 0.01)
+    assert profiler.nbr_ticks == 5
+    assert profiler.summary().startswith('Last 5 of 5 ticks.')
+
+
+def test_ticks_per_second_from_tick_durations():
+    assert profile(5, 0.01).ticks_per_second() == pytest.approx(100)
+    assert profile(30, 0.02, capacity=10).ticks_per_second() == pytest.approx(50)
+
+
+def test_end_tick_twice_does_not_add_a_tick():
+    profiler = profile(3, 0.01)
+    profiler.end_tick()
+    assert profiler.nbr_ticks == 3